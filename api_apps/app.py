@@ -1,33 +1,41 @@
-from flask import Flask
+import os
+from common.factory import create_app as create_service_app  # Import the shared application factory
+from common.metrics import register_cache  # Import the cache stats exporter
+from common.tracing import Traced  # Import the request phase timer
 from models.app_models import AppModel  # Import the database model
 from services.app_services import AppService  # Import the app service
+from services.app_cache import create_cache, create_top_cache  # Import the cache factories
 from schemas.app_schemas import AppSchema  # Import the schema for validation
 from routes.app_routes import AppRoutes  # Import the API routes
-from flasgger import Swagger  # Import Swagger for API documentation
-from flask_cors import CORS  # Import CORS for cross-origin requests
 
-# Initialize the Flask application
-app = Flask(__name__)
-CORS(app)  # Enable CORS for the application
+def build_blueprints(db_conn):
+    # Initialize the service and schema for handling app logic and validation
+    cache = create_cache()  # Cache for single app lookups, configured by APP_CACHE_* variables
+    register_cache('apps', 'app_lookups', cache)  # Export its hits, misses and evictions on /metrics
+    app_service = AppService(
+        db_conn,
+        id_block_size=int(os.environ.get('ID_BLOCK_SIZE', 1)),  # IDs leased per round trip
+        cache=cache,
+        top_cache=create_top_cache()  # Cache for the most liked apps, configured by TOP_APPS_CACHE_* variables
+    )
+    app_schema = AppSchema()
 
-# Initialize Swagger for API documentation
-swagger = Swagger(app)
+    # Create the app routes, timing the service and validation calls of every request
+    return [AppRoutes(Traced(app_service, 'service'), Traced(app_schema, 'validation'))]
 
-# Create the database connection
-db_conn = AppModel()
-db_conn.connect_to_database()  # Connect to the MongoDB database
+def create_app():
+    # Every process that calls create_app gets its own MongoClient
+    return create_service_app({
+        'NAME': __name__,
+        'SERVICE': 'apps',
+        'MODEL': AppModel,
+        'BLUEPRINTS': build_blueprints
+    })
 
-# Initialize the service and schema for handling app logic and validation
-app_service = AppService(db_conn)
-app_schema = AppSchema()
-
-# Create and register the app routes
-app_routes = AppRoutes(app_service, app_schema)
-app.register_blueprint(app_routes)
-
-# Entry point for running the Flask application
+# Entry point for running the Flask development server, production uses wsgi.py
 if __name__ == '__main__':
+    app = create_app()
     try:
         app.run(port=8001, debug=True)  # Run the app in debug mode for development
     finally:
-        db_conn.close_connection()  # Ensure the database connection is closed properly
+        app.extensions['db_conn'].close_connection()  # Ensure the database connection is closed properly
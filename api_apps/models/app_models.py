@@ -1,60 +1,126 @@
-import os
+import sys
+import argparse
+from common.models import MongoModel
 from logger.logger_apps import Logger
-from pymongo import MongoClient
-
-class AppModel:  # Define the class to manage the database connection
-    def __init__(self):  # Initialize the class
-        self.client = None  # MongoDB client will be stored here
-        self.db = None  # Database object will be stored here
-        self.logger = Logger()  # Create a logger instance
-
-    def connect_to_database(self):
-        # Get MongoDB credentials from environment variables
-        mongodb_user = os.environ.get('MONGODB_USER')
-        mongodb_pass = os.environ.get('MONGODB_PASS')
-        mongodb_host = os.environ.get('MONGODB_HOST')
-
-        # Check if the required environment variables are set
-        if not mongodb_user or not mongodb_pass or not mongodb_host:
-            self.logger.critical('MongoDB environment variables are required but missing')
-            raise ValueError('Set environment variables: MONGODB_USER, MONGODB_PASS, MONGODB_HOST')
-
-        try:
-            # Connect to the MongoDB database
-            self.client = MongoClient(
-                host=mongodb_host,  # Database host
-                port=27017,  # Default MongoDB port
-                username=mongodb_user,  # Database username
-                password=mongodb_pass,  # Database password
-                authSource='admin',  # Authentication database
-                authMechanism='SCRAM-SHA-256',  # Authentication method
-                serverSelectionTimeoutMS=5000  # Timeout for server selection
-            )
-            self.db = self.client['microservices']  # Access the "microservices" database
-            # Log a message if the connection is successful
-            if self.db.list_collection_names():  
-                self.logger.info('Connected to MongoDB database successfully')
-
-        except Exception as e:
-            # Log a critical error message if the connection fails
-            self.logger.critical(f'Failed to connect to the database: {e}')
-            raise
-
-    def close_connection(self):
-        # Close the connection to the database if it is open
-        if self.client:
-            self.client.close()
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, UpdateOne
+
+def name_key(name):
+    # Normalized app name, "MyApp" and "myapp" share the same key
+    return name.casefold()
+
+# Indexes needed by the hot queries of the apps service, keyed by collection
+INDEXES = {
+    'apps': [
+        IndexModel([('name', ASCENDING)], name='name_unique', unique=True),  # Name prefix search and sort
+        IndexModel([('name_key', ASCENDING)], name='name_key_unique', unique=True,
+                   partialFilterExpression={'name_key': {'$exists': True}}),  # check_app_exists, get_app_by_name
+        IndexModel([('author', ASCENDING), ('_id', ASCENDING)], name='author_id'),  # Pages of the apps of a user
+        IndexModel([('like_count', DESCENDING), ('_id', ASCENDING)], name='like_count'),  # Most liked apps
+        IndexModel([('likes_updated_at', ASCENDING)], name='likes_updated_at'),  # Apps the similar apps job recomputes
+        IndexModel([('origin', ASCENDING), ('name', ASCENDING)], name='origin_name'),  # Search filtered by origin
+        IndexModel([('name', TEXT), ('info', TEXT), ('description', TEXT)], name='search_text',
+                   weights={'name': 10, 'info': 3, 'description': 1}),  # Full-text search
+    ],
+    'similar_apps': [
+        IndexModel([('similar._id', ASCENDING)], name='similar_id'),  # Lists naming an app, to fix on change or delete
+    ],
+}
+
+class AppModel(MongoModel):  # Define the class to manage the database connection
+    def __init__(self):  # Initialize the connection with the apps logger and indexes
+        super().__init__(Logger(), INDEXES)
+
+    def backfill_name_keys(self, batch_size=1000):
+        # Set name_key on the apps created before it existed, returns the apps whose key is already taken
+        taken = {app['name_key']: app['_id'] for app in self.db.apps.find({'name_key': {'$exists': True}}, {'name_key': 1})}
+        conflicts, batch = [], []
+        for app in self.db.apps.find({'name_key': {'$exists': False}}, {'name': 1}).sort('_id', 1):
+            key = name_key(app['name'])
+            if key in taken:
+                conflicts.append((app['_id'], app['name'], taken[key]))
+                continue
+            taken[key] = app['_id']
+            batch.append(UpdateOne({'_id': app['_id']}, {'$set': {'name_key': key}}))
+            if len(batch) >= batch_size:
+                self.db.apps.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            self.db.apps.bulk_write(batch, ordered=False)
+        return conflicts
+
+    def rebuild_author_counts(self):
+        # Recompute every per-author app count in one aggregation pass, e.g. after a crash between two writes
+        self.db.apps.aggregate([
+            {'$match': {'author': {'$exists': True}}},
+            {'$group': {'_id': '$author', 'app_count': {'$sum': 1}}},
+            {'$out': 'author_counts'}
+        ])
+
+    def rebuild_like_counts(self, batch_size=1000):
+        # Recount the likes of every app from users.likedApps in one aggregation pass
+        counted, batch = set(), []
+        pipeline = [
+            {'$unwind': '$likedApps'},
+            {'$group': {'_id': '$likedApps', 'like_count': {'$sum': 1}}}
+        ]
+        for row in self.db.users.aggregate(pipeline, allowDiskUse=True):
+            counted.add(row['_id'])
+            # Only touch the apps whose count is wrong, likes_updated_at tells the top apps cache and
+            # the similar apps job that they changed
+            batch.append(UpdateOne({'_id': row['_id'], 'like_count': {'$ne': row['like_count']}},
+                                   {'$set': {'like_count': row['like_count']}, '$currentDate': {'likes_updated_at': True}}))
+            if len(batch) >= batch_size:
+                self.db.apps.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            self.db.apps.bulk_write(batch, ordered=False)
+
+        # Apps nobody likes anymore, or created before like_count existed, go back to zero
+        query = {'$or': [{'like_count': {'$gt': 0}}, {'like_count': None}]}
+        stale = [app['_id'] for app in self.db.apps.find(query, {'_id': 1}) if app['_id'] not in counted]
+        for start in range(0, len(stale), batch_size):
+            self.db.apps.update_many({'_id': {'$in': stale[start:start + batch_size]}},
+                                     {'$set': {'like_count': 0}, '$currentDate': {'likes_updated_at': True}})
+        return len(counted)
 
 if __name__ == '__main__':
+    # Parse the command line options
+    parser = argparse.ArgumentParser(description='Apps database connection')
+    parser.add_argument('--ensure-indexes', action='store_true', help='Create the apps indexes and exit')
+    parser.add_argument('--backfill-name-keys', action='store_true',
+                        help='Set the case-insensitive name_key on existing apps and exit, required once on deploy')
+    parser.add_argument('--rebuild-author-counts', action='store_true',
+                        help='Recompute the number of apps of every author and exit, required once on deploy')
+    parser.add_argument('--rebuild-like-counts', action='store_true',
+                        help='Recompute the like_count of every app from the users likes and exit, required once on deploy')
+    args = parser.parse_args()
+
     db_conn = AppModel()  # Create an instance of the AppModel class
+    exit_code = 0
 
     try: 
         # Try to connect to the database
-        db_conn.connect_to_database()
+        db_conn.connect_to_database(create_indexes=False)
+        if args.ensure_indexes:
+            # Create the indexes, e.g. from a migration before a deploy
+            db_conn.ensure_indexes()
+        if args.backfill_name_keys:
+            # Apps differing only by case can't share a key, they must be renamed by hand
+            conflicts = db_conn.backfill_name_keys()
+            for app_id, name, other_id in conflicts:
+                db_conn.logger.critical(f'App {app_id} "{name}" clashes with app {other_id}, rename it and run again')
+            exit_code = 1 if conflicts else 0
+        if args.rebuild_author_counts:
+            db_conn.rebuild_author_counts()
+        if args.rebuild_like_counts:
+            liked = db_conn.rebuild_like_counts()
+            db_conn.logger.info(f'Like counts rebuilt, {liked} apps have likes')
     except Exception as e:
         # Log any errors that occur during the connection
         db_conn.logger.critical(f'An error occurred: {e}')
+        exit_code = 1
     finally: 
         # Ensure the database connection is closed
         db_conn.close_connection()
         db_conn.logger.info('Connection to the database was successfully closed')
+    sys.exit(exit_code)
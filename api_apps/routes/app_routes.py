@@ -1,7 +1,9 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from marshmallow import ValidationError
 from logger.logger_apps import Logger
 from flasgger import swag_from
+from services.app_services import DEFAULT_BATCH_SIZE, DEFAULT_PAGE_SIZE, DEFAULT_SIMILAR_APPS, MAX_IDS_BATCH, MAX_PAGE_SIZE, MAX_SEARCH_OFFSET, MAX_TOP_APPS, SEARCH_SORTS
+from services.similar_apps import DEFAULT_TOP_N
 
 class AppRoutes(Blueprint):
     def __init__(self, app_service, app_schema):
@@ -15,18 +17,69 @@ class AppRoutes(Blueprint):
     def register_routes(self):
         # Define all API endpoints for the application
         self.route('/api/v1/apps', methods=['GET'])(self.get_apps)
+        self.route('/api/v1/apps/search', methods=['GET'])(self.search_apps)
+        self.route('/api/v1/apps/top', methods=['GET'])(self.get_top_apps)
+        self.route('/api/v1/apps/by-author/<string:author_id>', methods=['GET'])(self.get_apps_by_author)
         self.route('/api/v1/apps', methods=['POST'])(self.add_app)
         self.route('/api/v1/apps/<int:app_id>', methods=['PUT'])(self.update_app)
         self.route('/api/v1/apps/<int:app_id>', methods=['DELETE'])(self.delete_app)
         self.route('/api/v1/apps/<int:app_id>', methods=['GET'])(self.get_app_by_id)
-        self.route('/healthcheck', methods=['GET'])(self.healthcheck)
+        self.route('/api/v1/apps/<int:app_id>/similar', methods=['GET'])(self.get_similar_apps)
         self.route('/api/v1/apps/<string:name>', methods=['GET'])(self.get_app_by_name)
 
     @swag_from({
         'tags': ['Apps'],  # Swagger tag to group endpoints
+        'parameters': [
+            {
+                'name': 'ids',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': f'Comma separated list of app IDs to retrieve (max {MAX_IDS_BATCH})'
+            },
+            {
+                'name': 'after',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Cursor returned as "next" by the previous page'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Number of apps per page (max {MAX_PAGE_SIZE})'
+            },
+            {
+                'name': 'fields',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Comma separated list of fields to return'
+            },
+            {
+                'name': 'stream',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': 'Stream every app as NDJSON (same as Accept: application/x-ndjson)'
+            },
+            {
+                'name': 'batch_size',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': 'Apps fetched per database round trip when streaming'
+            }
+        ],
         'responses': {
             200: {
-                'description': 'List of all apps'
+                'description': 'List of all apps, a page of apps when after, limit or fields are given, '
+                               'or the requested apps when ids is given'
+            },
+            400: {
+                'description': 'Invalid pagination parameters'
             },
             500: {
                 'description': 'Internal server error'
@@ -35,14 +88,360 @@ class AppRoutes(Blueprint):
     })
     def get_apps(self):
         try:
-            # Fetch all apps using the service
-            apps = self.app_service.get_all_apps()
-            return jsonify(apps), 200
+            # Fetch several apps by ID in one request
+            if 'ids' in request.args:
+                try:
+                    app_ids = list(dict.fromkeys(int(app_id) for app_id in request.args['ids'].split(',') if app_id))
+                except ValueError:
+                    return jsonify({'error': 'Invalid ids, they must be integers'}), 400
+                if not app_ids or len(app_ids) > MAX_IDS_BATCH:
+                    return jsonify({'error': f'Between 1 and {MAX_IDS_BATCH} ids must be requested'}), 400
+
+                apps = self.app_service.get_apps_by_ids(app_ids)
+
+                # If the service response is already a Response object, return it
+                if isinstance(apps, tuple):
+                    return apps
+
+                return jsonify(apps), 200
+
+            # Stream the whole catalog one app per line when NDJSON is requested
+            if self.wants_stream():
+                try:
+                    batch_size = int(request.args.get('batch_size', DEFAULT_BATCH_SIZE))
+                except ValueError:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+                if batch_size < 1:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+
+                cursor = self.app_service.stream_all_apps(batch_size)
+                return self.ndjson_response(cursor)
+
+            # Without pagination parameters keep returning the whole list
+            if not any(arg in request.args for arg in ('after', 'limit', 'fields')):
+                # Fetch all apps using the service
+                apps = self.app_service.get_all_apps()
+                return jsonify(apps), 200
+
+            try:
+                after, limit, fields = self.parse_page_args()
+            except ValueError as e:
+                return jsonify({'error': f'Invalid pagination parameters: {e}'}), 400
+
+            # Fetch a single page of apps using the service
+            page = self.app_service.get_apps_page(after, limit, fields)
+
+            # If the service response is already a Response object, return it
+            if isinstance(page, tuple):
+                return page
+
+            return jsonify(page), 200
         except Exception as e:
             # Log an error if fetching fails
             self.logger.error(f'Error fetching apps: {e}')
             return jsonify({'error': f'Error fetching apps: {e}'}), 500
 
+    def wants_stream(self):
+        # NDJSON is requested with ?stream=1 or through the Accept header
+        if request.args.get('stream') in ('1', 'true'):
+            return True
+        return request.accept_mimetypes.best == 'application/x-ndjson'
+
+    def ndjson_response(self, cursor):
+        def generate():
+            try:
+                # Serialize and send every document as soon as its batch arrives
+                for document in cursor:
+                    yield current_app.json.dumps(document) + '\n'
+            finally:
+                cursor.close()
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    def parse_page_args(self):
+        # Read the cursor, page size and projection from the query string
+        after = request.args.get('after')
+        after = int(after) if after else None
+
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+        fields = [field for field in request.args.get('fields', '').split(',') if field]
+        unknown = [field for field in fields if field != '_id' and field not in self.app_schema.fields]
+        if unknown:
+            raise ValueError(f'unknown fields {unknown}')
+
+        return after, limit, fields
+
+    @swag_from({
+        'tags': ['Apps'],
+        'parameters': [
+            {
+                'name': 'q',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Full-text search over name, info and description'
+            },
+            {
+                'name': 'prefix',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Only apps whose name starts with this text, ignoring case'
+            },
+            {
+                'name': 'origin',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Only apps from this origin'
+            },
+            {
+                'name': 'author',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Only apps of this author'
+            },
+            {
+                'name': 'sort',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'enum': list(SEARCH_SORTS),
+                'description': 'Sort key, relevance by default when q is given, name otherwise'
+            },
+            {
+                'name': 'offset',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Apps to skip, returned as "next_offset" by the previous page (max {MAX_SEARCH_OFFSET})'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Number of apps per page (max {MAX_PAGE_SIZE})'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'A page of matching apps and the offset of the next page'
+            },
+            400: {
+                'description': 'Invalid search parameters'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def search_apps(self):
+        try:
+            try:
+                offset = int(request.args.get('offset', 0))
+                limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+            except ValueError:
+                return jsonify({'error': 'Invalid offset or limit, they must be integers'}), 400
+            if offset < 0 or offset > MAX_SEARCH_OFFSET or limit < 1 or limit > MAX_PAGE_SIZE:
+                return jsonify({'error': f'offset must be between 0 and {MAX_SEARCH_OFFSET} '
+                                         f'and limit between 1 and {MAX_PAGE_SIZE}'}), 400
+
+            sort = request.args.get('sort')
+            if sort not in (None, *SEARCH_SORTS) or (sort == 'relevance' and not request.args.get('q')):
+                return jsonify({'error': f'Invalid sort, use one of {list(SEARCH_SORTS)} (relevance needs q)'}), 400
+
+            # Search the apps using the service
+            page = self.app_service.search_apps(
+                text=request.args.get('q'),
+                prefix=request.args.get('prefix'),
+                origin=request.args.get('origin'),
+                author=request.args.get('author'),
+                sort=sort,
+                offset=offset,
+                limit=limit
+            )
+
+            # If the service response is already a Response object, return it
+            if isinstance(page, tuple):
+                return page
+
+            return jsonify(page), 200
+        except Exception as e:
+            # Log an error if the search fails
+            self.logger.error(f'Error searching apps: {e}')
+            return jsonify({'error': f'Error searching apps: {e}'}), 500
+
+    @swag_from({
+        'tags': ['Apps'],
+        'parameters': [
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Number of apps to return (default 10, max {MAX_TOP_APPS})'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'The most liked apps, by like_count'
+            },
+            400: {
+                'description': 'Invalid limit'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def get_top_apps(self):
+        try:
+            try:
+                limit = int(request.args.get('limit', 10))
+            except ValueError:
+                return jsonify({'error': 'Invalid limit, it must be an integer'}), 400
+            if limit < 1 or limit > MAX_TOP_APPS:
+                return jsonify({'error': f'limit must be between 1 and {MAX_TOP_APPS}'}), 400
+
+            # Fetch the leaderboard using the service
+            apps = self.app_service.get_top_apps(limit)
+
+            # If the service response is already a Response object, return it
+            if isinstance(apps, tuple):
+                return apps
+
+            return jsonify(apps), 200
+        except Exception as e:
+            # Log an error if fetching fails
+            self.logger.error(f'Error fetching the most liked apps: {e}')
+            return jsonify({'error': f'Error fetching the most liked apps: {e}'}), 500
+
+    @swag_from({
+        'tags': ['Apps'],
+        'parameters': [
+            {
+                'name': 'app_id',
+                'in': 'path',
+                'required': True,
+                'type': 'integer',
+                'description': 'App ID to find similar apps for'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Number of similar apps (default {DEFAULT_SIMILAR_APPS}, max {DEFAULT_TOP_N})'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Apps most often liked by the users who liked this app, best first'
+            },
+            400: {
+                'description': 'Invalid limit'
+            },
+            404: {
+                'description': 'App not found'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def get_similar_apps(self, app_id):
+        try:
+            try:
+                limit = int(request.args.get('limit', DEFAULT_SIMILAR_APPS))
+            except ValueError:
+                return jsonify({'error': 'Invalid limit, it must be an integer'}), 400
+            if limit < 1 or limit > DEFAULT_TOP_N:
+                return jsonify({'error': f'limit must be between 1 and {DEFAULT_TOP_N}'}), 400
+
+            # Fetch the precomputed list using the service
+            similar = self.app_service.get_similar_apps(app_id, limit)
+            if similar is None:
+                return jsonify({'error': 'App not found'}), 404
+
+            # If the service response is already a Response object, return it
+            if isinstance(similar, tuple):
+                return similar
+
+            return jsonify(similar), 200
+        except Exception as e:
+            # Log an error if fetching fails
+            self.logger.error(f'Error fetching the similar apps: {e}')
+            return jsonify({'error': f'Error fetching the similar apps: {e}'}), 500
+
+    @swag_from({
+        'tags': ['Apps'],
+        'parameters': [
+            {
+                'name': 'author_id',
+                'in': 'path',
+                'required': True,
+                'type': 'string',
+                'description': 'User ID of the author'
+            },
+            {
+                'name': 'after',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Cursor returned as "next" by the previous page'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Number of apps per page (max {MAX_PAGE_SIZE})'
+            },
+            {
+                'name': 'fields',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'description': 'Comma separated list of fields to return'
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'A page of the apps of the author and the author\'s app count'
+            },
+            400: {
+                'description': 'Invalid pagination parameters'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def get_apps_by_author(self, author_id):
+        try:
+            try:
+                after, limit, fields = self.parse_page_args()
+            except ValueError as e:
+                return jsonify({'error': f'Invalid pagination parameters: {e}'}), 400
+
+            # Fetch a page of the author's apps using the service
+            page = self.app_service.get_apps_by_author(author_id, after, limit, fields)
+
+            # If the service response is already a Response object, return it
+            if isinstance(page, tuple):
+                return page
+
+            return jsonify(page), 200
+        except Exception as e:
+            # Log an error if fetching fails
+            self.logger.error(f'Error fetching the apps of the author: {e}')
+            return jsonify({'error': f'Error fetching the apps of the author: {e}'}), 500
+
     @swag_from({
         'tags': ['Apps'],
         'parameters': [
@@ -85,13 +484,13 @@ class AppRoutes(Blueprint):
                 return jsonify({'error': 'Invalid data, empty'}), 401
 
             try:
-                # Validate the input schema using Marshmallow
-                self.app_schema.load(request_data)
+                # Validate the input schema using Marshmallow and keep the loaded data
+                app_data = self.app_schema.load(request_data)
             except ValidationError as e:
                 return jsonify({'error': f'Validation failed: {e.messages}'}), 400
 
             # Call the service to add the app
-            service_response = self.app_service.add_app(request_data)
+            service_response = self.app_service.add_app(app_data)
 
             # If the service response is already a Response object, return it
             if isinstance(service_response, tuple):
@@ -154,14 +553,18 @@ class AppRoutes(Blueprint):
 
             try:
                 # Validate only the fields provided in the request (partial update)
-                self.app_schema.load(request_data, partial=True)
+                app_data = self.app_schema.load(request_data, partial=True)
             except ValidationError as e:
                 return jsonify({'error': f'Validation failed: {e.messages}'}), 405
 
-            updated_app = self.app_service.update_app(app_id, request_data)
+            updated_app = self.app_service.update_app(app_id, app_data)
             if updated_app is None:
                 return jsonify({'error': 'App not found'}), 404
 
+            # If the service response is already a Response object, return it
+            if isinstance(updated_app, tuple):
+                return updated_app
+
             return jsonify({'message': 'App successfully updated', 'app': updated_app}), 201
         except Exception as e:
             self.logger.error(f'Error updating app: {e}')
@@ -272,7 +675,3 @@ class AppRoutes(Blueprint):
         except Exception as e:
             self.logger.error(f'Error fetching app by name: {e}')
             return jsonify({'error': f'Error fetching app by name: {e}'}), 507
-
-    def healthcheck(self):
-        # Healthcheck endpoint to verify service is running
-        return jsonify({'status': 'up'}), 200
@@ -1,6 +1,9 @@
 from marshmallow import fields, validates, ValidationError, Schema
 import re
 
+# Compiled once at import instead of on every request
+URL_REGEX = re.compile(r'^(https?:\/\/)?([\w\-])+(\.[\w\-]+)+[\w\-\.,@?^=%&:/~+#]*[\w\-\@?^=%&/~+#]$')
+
 class AppSchema(Schema):
     # Define the fields for the schema with their validation requirements
     name = fields.String(required=True)  # App name is mandatory
@@ -35,19 +38,17 @@ class AppSchema(Schema):
 
     @validates('url')
     def validate_url(self, value):
-        # Validate the URL format using a regular expression
-        url_regex = r'^(https?:\/\/)?([\w\-])+(\.[\w\-]+)+[\w\-\.,@?^=%&:/~+#]*[\w\-\@?^=%&/~+#]$'
-        if not re.match(url_regex, value):
-            raise ValidationError('Invalid URL format')
+        # Check the length first so the regex never runs on oversized input
         if len(value) > 200:
             raise ValidationError('URL must not exceed 200 characters')
+        if not URL_REGEX.match(value):
+            raise ValidationError('Invalid URL format')
 
     @validates('logo_url')
     def validate_logo_url(self, value):
         # If a logo URL is provided, validate its format and length
         if value:
-            url_regex = r'^(https?:\/\/)?([\w\-])+(\.[\w\-]+)+[\w\-\.,@?^=%&:/~+#]*[\w\-\@?^=%&/~+#]$'
-            if not re.match(url_regex, value):
-                raise ValidationError('Invalid logo URL format')
             if len(value) > 200:
                 raise ValidationError('Logo URL must not exceed 200 characters')
+            if not URL_REGEX.match(value):
+                raise ValidationError('Invalid logo URL format')
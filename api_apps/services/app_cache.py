@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from bson import json_util
+
+class LRUCache:
+    # In-process cache with a size bound, least recently used eviction and a TTL per entry
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size  # Maximum number of entries kept in memory
+        self.ttl = ttl  # Seconds an entry stays valid
+        self.entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, now):
+        # Caller holds the lock
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < now:
+            # Missing or expired, drop the stale entry
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)  # Mark as recently used
+        self.hits += 1
+        return entry[1]
+
+    def store(self, key, value, expires_at):
+        # Caller holds the lock
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        # Evict the least recently used entries above the size bound
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self.lock:
+            return self.lookup(key, time.monotonic())
+
+    def get_many(self, keys):
+        # The entries found, keyed like the request, under a single lock
+        with self.lock:
+            now = time.monotonic()
+            return {key: value for key, value in ((key, self.lookup(key, now)) for key in keys) if value is not None}
+
+    def set(self, key, value):
+        with self.lock:
+            self.store(key, value, time.monotonic() + self.ttl)
+
+    def set_many(self, items):
+        with self.lock:
+            expires_at = time.monotonic() + self.ttl
+            for key, value in items.items():
+                self.store(key, value, expires_at)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self.entries)}
+
+class RedisCache:
+    # Same interface backed by a Redis compatible server, shared by every worker
+    def __init__(self, url, ttl=60, prefix='apps:', client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError('The redis package is required to use APP_CACHE_URL')
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json_util.loads(value)
+
+    def set(self, key, value):
+        # Extended JSON keeps the BSON types, likes_updated_at comes back as a datetime.
+        # Redis expires the entry and evicts with its own maxmemory policy
+        self.client.set(self.prefix + key, json_util.dumps(value), ex=self.ttl)
+
+    def get_many(self, keys):
+        # One MGET for every key
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        found = {key: json_util.loads(value) for key, value in zip(keys, values) if value is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        # One pipelined round trip for every entry
+        if items:
+            pipeline = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(self.prefix + key, json_util.dumps(value), ex=self.ttl)
+            pipeline.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': 0}
+
+class TopAppsCache:
+    # The first entries of the most liked apps leaderboard. Once older than ttl only the apps whose likes changed
+    # are read and merged in, the whole leaderboard is read again every full_ttl
+    def __init__(self, size=100, ttl=5, full_ttl=60):
+        self.size = size  # Apps kept, requests for more go to the database
+        self.ttl = ttl  # Seconds before the changed apps are read
+        self.full_ttl = full_ttl  # Seconds before the whole leaderboard is read, picks up renames and other workers' deletes
+        self.apps = []  # Sorted like the like_count index
+        self.since = None  # likes_updated_at the leaderboard is current up to
+        self.expires_at = 0
+        self.full_expires_at = 0
+        self.lock = threading.Lock()
+
+    def get(self, limit):
+        with self.lock:
+            if limit > self.size or self.expires_at < time.monotonic():
+                return None
+            return [dict(app) for app in self.apps[:limit]]
+
+    def set(self, apps, since):
+        with self.lock:
+            now = time.monotonic()
+            self.apps = [dict(app) for app in apps[:self.size]]
+            self.since = since
+            self.expires_at = now + self.ttl
+            self.full_expires_at = now + self.full_ttl
+
+    def merge(self, changed, since):
+        # Apply the apps whose likes changed, returns False when only reading the whole leaderboard is correct
+        def rank(app):
+            return -(app.get('like_count') or 0), app['_id']
+
+        with self.lock:
+            now = time.monotonic()
+            if self.full_expires_at < now or len(self.apps) < self.size:
+                return False  # Too old, or a short catalog where any new app belongs on the leaderboard
+            # Every app off the leaderboard ranks after the last one, so gains and newcomers can be merged. An
+            # app falling behind the last one may be overtaken by apps we haven't read
+            last = rank(self.apps[-1])
+            board = {app['_id']: app for app in self.apps}
+            for app in changed:
+                if app['_id'] in board and rank(app) > last:
+                    return False
+                board[app['_id']] = dict(app)
+
+            self.apps = sorted(board.values(), key=rank)[:self.size]
+            self.since = max(self.since, since)
+            self.expires_at = now + self.ttl
+            return True
+
+    def forget(self, app_id):
+        # Drop the leaderboard only when a changed or deleted app is on it
+        with self.lock:
+            if any(app['_id'] == app_id for app in self.apps):
+                self.apps = []
+                self.expires_at = 0
+                self.full_expires_at = 0
+
+def create_top_cache():
+    # Build the leaderboard cache from environment variables, TOP_APPS_CACHE_SIZE=0 disables it
+    size = int(os.environ.get('TOP_APPS_CACHE_SIZE', 100))
+    if size <= 0:
+        return None
+    return TopAppsCache(size, float(os.environ.get('TOP_APPS_CACHE_TTL', 5)), float(os.environ.get('TOP_APPS_CACHE_FULL_TTL', 60)))
+
+def create_cache():
+    # Build the cache from environment variables, APP_CACHE_SIZE=0 disables it
+    ttl = int(os.environ.get('APP_CACHE_TTL', 60))
+    url = os.environ.get('APP_CACHE_URL')
+    if url:
+        return RedisCache(url, ttl)
+
+    max_size = int(os.environ.get('APP_CACHE_SIZE', 1024))
+    if max_size <= 0:
+        return None
+    return LRUCache(max_size, ttl)
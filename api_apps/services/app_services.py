@@ -1,11 +1,122 @@
+import re
+import datetime
 from flask import jsonify
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from logger.logger_apps import Logger
+from common.id_allocator import IdAllocator
+from models.app_models import name_key
+
+DEFAULT_PAGE_SIZE = 50  # Apps returned per page when no limit is given
+MAX_PAGE_SIZE = 500  # Upper bound for the page size requested by clients
+DEFAULT_BATCH_SIZE = 1000  # Documents fetched per round trip when streaming
+MAX_IDS_BATCH = 100  # Apps that can be requested at once by ID
+MAX_TOP_APPS = 100  # Largest leaderboard that can be requested
+DEFAULT_SIMILAR_APPS = 10  # Similar apps returned when no limit is given
+MAX_SEARCH_OFFSET = 10000  # Deeper search pages are refused, skip() still walks every skipped app
+LIKES_LOOKBACK = datetime.timedelta(seconds=1)  # Likes stamped just before the last read may only show up after it
+
+# Sort keys accepted by the search, relevance only applies to full-text searches
+SEARCH_SORTS = {
+    'relevance': [('score', {'$meta': 'textScore'}), ('_id', 1)],  # _id breaks ties so pages don't overlap
+    'name': [('name', 1)],
+    '-name': [('name', -1)],
+    'newest': [('_id', -1)],
+    'oldest': [('_id', 1)],
+}
+
+def search_query(text=None, prefix=None, origin=None, author=None, sort=None):
+    # Build the filter, projection and sort of a search, every combination is served by an index:
+    # $text by the text index, prefix by name_key_unique, name sorts by name_unique, origin by origin_name,
+    # author by author_id
+    query, projection = {}, None
+    if text:
+        query['$text'] = {'$search': text}
+        projection = {'score': {'$meta': 'textScore'}}
+    if prefix:
+        # Case-insensitive like every other name lookup: an anchored regex on name_key is a range scan on its
+        # index, $exists repeats the partial index filter so the planner can use it
+        query['name_key'] = {'$regex': f'^{re.escape(name_key(prefix))}', '$exists': True}
+    if origin:
+        query['origin'] = origin
+    if author:
+        query['author'] = author
+
+    sort = sort or ('relevance' if text else 'name')
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f'sort must be one of {list(SEARCH_SORTS)}')
+    if sort == 'relevance' and not text:
+        raise ValueError('sort=relevance needs a q search')
+    return query, projection, SEARCH_SORTS[sort]
 
 class AppService:
-    def __init__(self, db_conn):
-        # Initialize the logger and the database connection
+    def __init__(self, db_conn, id_block_size=1, cache=None, top_cache=None):
+        # Initialize the logger, the database connection and the ID allocator
         self.logger = Logger()
         self.db_conn = db_conn
+        self.id_allocator = IdAllocator(db_conn, 'apps', id_block_size)
+        self.cache = cache  # Optional read-through cache for single app lookups
+        self.top_cache = top_cache  # Optional cache for the most liked apps
+
+    def cache_get(self, key):
+        # Return a copy so callers can't change the cached app. A failing cache counts as a miss
+        if self.cache is None:
+            return None
+        try:
+            app = self.cache.get(key)
+        except Exception as e:
+            self.logger.warning(f'Error reading {key} from the app cache, using the database: {e}')
+            return None
+        return dict(app) if app is not None else None
+
+    def cache_get_many(self, keys):
+        # Copies of the cached apps found among keys, in one cache round trip
+        if self.cache is None or not keys:
+            return {}
+        try:
+            found = self.cache.get_many(keys)
+        except Exception as e:
+            self.logger.warning(f'Error reading {len(keys)} apps from the app cache, using the database: {e}')
+            return {}
+        return {key: dict(app) for key, app in found.items()}
+
+    def cache_set(self, *apps):
+        # Store the apps under both of their lookup keys in one cache round trip, the request is served either way
+        if self.cache is not None:
+            items = {}
+            for app in apps:
+                if app is not None:
+                    items[f'id:{app["_id"]}'] = dict(app)
+                    items[f'name:{name_key(app["name"])}'] = dict(app)
+            try:
+                self.cache.set_many(items)
+            except Exception as e:
+                self.logger.warning(f'Error storing {len(apps)} apps in the app cache: {e}')
+
+    def cache_invalidate(self, *apps):
+        # Drop every key pointing to the given apps
+        if self.top_cache is not None:
+            for app in apps:
+                if app.get('_id') is not None:
+                    self.top_cache.forget(app['_id'])
+        if self.cache is None:
+            return
+        keys = []
+        for app in apps:
+            if app.get('_id') is not None:
+                keys.append(f'id:{app["_id"]}')
+            if app.get('name') is not None:
+                keys.append(f'name:{name_key(app["name"])}')
+        try:
+            self.cache.delete(*keys)
+        except Exception as e:
+            # The write is already done, the entries stay stale until their TTL runs out
+            self.logger.error(f'Error invalidating {keys} in the app cache: {e}')
+
+    def count_author_app(self, author, delta):
+        # Keep the per-author app count in step with the catalog, one small document per author
+        if author is not None:
+            self.db_conn.db.author_counts.update_one({'_id': author}, {'$inc': {'app_count': delta}}, upsert=True)
 
     def get_all_apps(self):
         try:
@@ -17,10 +128,129 @@ class AppService:
             self.logger.error(f'Error fetching all apps from the database: {e}')
             return jsonify({'error': f'Error fetching all apps from the database: {e}'}), 500
 
+    def get_apps_page(self, after=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+        try:
+            # Keyset pagination on _id: only read the apps after the last one the client saw
+            query = {'_id': {'$gt': after}} if after is not None else {}
+            # Turn the requested fields into a Mongo projection (_id is always returned for the cursor)
+            projection = {field: 1 for field in fields} if fields else None
+
+            # Ask for one extra app to know if there is a next page
+            cursor = self.db_conn.db.apps.find(query, projection).sort('_id', 1).limit(limit + 1)
+            apps = list(cursor)
+
+            next_cursor = None
+            if len(apps) > limit:
+                apps = apps[:limit]
+                next_cursor = str(apps[-1]['_id'])
+            return {'apps': apps, 'next': next_cursor}
+        except Exception as e:
+            # Log an error if the retrieval fails
+            self.logger.error(f'Error fetching a page of apps from the database: {e}')
+            return jsonify({'error': f'Error fetching a page of apps from the database: {e}'}), 500
+
+    def search_apps(self, text=None, prefix=None, origin=None, author=None, sort=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+        try:
+            query, projection, sort_keys = search_query(text, prefix, origin, author, sort)
+
+            # Ask for one extra app to know if there is a next page
+            cursor = self.db_conn.db.apps.find(query, projection).sort(sort_keys).skip(offset).limit(limit + 1)
+            apps = list(cursor)
+
+            next_offset = offset + limit if len(apps) > limit else None
+            return {'apps': apps[:limit], 'next_offset': next_offset}
+        except Exception as e:
+            # Log an error if the search fails
+            self.logger.error(f'Error searching the apps in the database: {e}')
+            return jsonify({'error': f'Error searching the apps in the database: {e}'}), 500
+
+    def get_apps_by_author(self, author, after=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+        try:
+            # Keyset pagination on _id within the author, served by the (author, _id) index
+            query = {'author': author}
+            if after is not None:
+                query['_id'] = {'$gt': after}
+            projection = {field: 1 for field in fields} if fields else None
+
+            # Ask for one extra app to know if there is a next page
+            apps = list(self.db_conn.db.apps.find(query, projection).sort('_id', 1).limit(limit + 1))
+
+            next_cursor = None
+            if len(apps) > limit:
+                apps = apps[:limit]
+                next_cursor = str(apps[-1]['_id'])
+
+            # The total comes from the author's counter instead of counting the catalog
+            counts = self.db_conn.db.author_counts.find_one({'_id': author}) or {}
+            return {'author': author, 'app_count': counts.get('app_count', 0), 'apps': apps, 'next': next_cursor}
+        except Exception as e:
+            # Log an error if the retrieval fails
+            self.logger.error(f'Error fetching the apps of the author from the database: {e}')
+            return jsonify({'error': f'Error fetching the apps of the author from the database: {e}'}), 500
+
+    def get_top_apps(self, limit):
+        try:
+            # Serve the leaderboard from memory while it is fresh, or bring it up to date with the apps liked since
+            if self.top_cache is not None:
+                apps = self.top_cache.get(limit)
+                if apps is not None:
+                    return apps
+                if limit <= self.top_cache.size and self.refresh_top_apps():
+                    return self.top_cache.get(limit)
+
+            # Read the whole cached leaderboard at once, it is a short walk of the like_count index
+            size = max(limit, self.top_cache.size) if self.top_cache is not None else limit
+            since = self.latest_like() if self.top_cache is not None else None
+            apps = list(self.db_conn.db.apps.find({}).sort([('like_count', -1), ('_id', 1)]).limit(size))
+            if self.top_cache is not None:
+                self.top_cache.set(apps, since)
+            return apps[:limit]
+        except Exception as e:
+            # Log an error if the retrieval fails
+            self.logger.error(f'Error fetching the most liked apps from the database: {e}')
+            return jsonify({'error': f'Error fetching the most liked apps from the database: {e}'}), 500
+
+    def latest_like(self):
+        # Newest likes_updated_at, read before the leaderboard so no like falls between the two
+        app = self.db_conn.db.apps.find_one({'likes_updated_at': {'$exists': True}}, {'likes_updated_at': 1},
+                                            sort=[('likes_updated_at', -1)])
+        return app['likes_updated_at'] if app else datetime.datetime(1970, 1, 1)
+
+    def refresh_top_apps(self):
+        # Read the apps liked or unliked since the last read through the likes_updated_at index and merge them in
+        since = self.top_cache.since
+        if since is None:
+            return False
+        query = {'likes_updated_at': {'$gte': since - LIKES_LOOKBACK}}
+        changed = list(self.db_conn.db.apps.find(query).limit(self.top_cache.size))
+        if len(changed) >= self.top_cache.size:
+            return False  # As many reads as the whole leaderboard
+        return self.top_cache.merge(changed, max((app['likes_updated_at'] for app in changed), default=since))
+
+    def get_similar_apps(self, app_id, limit=DEFAULT_SIMILAR_APPS):
+        try:
+            # The lists are precomputed by the similar apps job, a read is one lookup by _id
+            similar = self.db_conn.db.similar_apps.find_one({'_id': app_id}, {'similar': {'$slice': limit}, 'built_at': 1})
+            if similar is not None:
+                return {'app_id': app_id, 'similar': similar['similar'], 'built_at': similar['built_at']}
+
+            # No list yet, tell a missing app from an app nobody liked together with others
+            if self.get_app_by_id(app_id) is None:
+                return None
+            return {'app_id': app_id, 'similar': [], 'built_at': None}
+        except Exception as e:
+            # Log an error if the retrieval fails
+            self.logger.error(f'Error fetching the similar apps from the database: {e}')
+            return jsonify({'error': f'Error fetching the similar apps from the database: {e}'}), 500
+
+    def stream_all_apps(self, batch_size=DEFAULT_BATCH_SIZE):
+        # Return a lazy cursor instead of a list, so apps are fetched in batches while iterating
+        return self.db_conn.db.apps.find({}).sort('_id', 1).batch_size(batch_size)
+
     def check_app_exists(self, name):
         try:
-            # Check if an app with the given name exists in the database
-            app = self.db_conn.db.apps.find_one({'name': name})
+            # Check if an app with the given name exists in the database, whatever its case
+            app = self.db_conn.db.apps.find_one({'name_key': name_key(name)}, {'_id': 1})
             return app is not None
         except Exception as e:
             # Log an error if the check fails
@@ -33,14 +263,19 @@ class AppService:
             if self.check_app_exists(new_app['name']):
                 return jsonify({'error': 'App already exists'}), 400
 
-            # Find the last app ID and calculate the next ID
-            last_app = self.db_conn.db.apps.find_one(sort=[('_id', -1)])
-            next_id = (last_app['_id'] + 1) if last_app else 1
-            new_app['_id'] = next_id
+            # Take the next app ID from the shared counter
+            new_app['_id'] = self.id_allocator.next()
+            new_app['name_key'] = name_key(new_app['name'])
+            new_app['like_count'] = 0  # Kept up to date by the users service
 
             # Insert the new app into the database
             self.db_conn.db.apps.insert_one(new_app)
+            self.count_author_app(new_app.get('author'), 1)
+            self.cache_invalidate(new_app)
             return new_app
+        except DuplicateKeyError:
+            # Another request created the same name since the check, the unique index has the last word
+            return jsonify({'error': 'App already exists'}), 400
         except Exception as e:
             # Log an error if the insertion fails
             self.logger.error(f'Error creating the new app: {e}')
@@ -48,18 +283,55 @@ class AppService:
 
     def get_app_by_id(self, app_id):
         try:
+            # Serve the app from the cache when possible
+            app = self.cache_get(f'id:{app_id}')
+            if app is not None:
+                return app
+
             # Retrieve the app by its unique ID
             app = self.db_conn.db.apps.find_one({'_id': app_id})
+            self.cache_set(app)
             return app
         except Exception as e:
             # Log an error if the retrieval fails
             self.logger.error(f'Error fetching the app by ID from the database: {e}')
             return jsonify({'error': f'Error fetching the app by ID from the database: {e}'}), 500
 
+    def get_apps_by_ids(self, app_ids):
+        try:
+            # Take what we can from the cache first, with a single cache round trip
+            cached = self.cache_get_many([f'id:{app_id}' for app_id in app_ids])
+            found = {app_id: cached[f'id:{app_id}'] for app_id in app_ids if f'id:{app_id}' in cached}
+
+            # Fetch the rest with a single $in query, and cache them with a single round trip
+            pending = [app_id for app_id in app_ids if app_id not in found]
+            if pending:
+                fetched = list(self.db_conn.db.apps.find({'_id': {'$in': pending}}))
+                for app in fetched:
+                    found[app['_id']] = app
+                self.cache_set(*fetched)
+
+            # Keep the order requested by the client
+            return {
+                'apps': [found[app_id] for app_id in app_ids if app_id in found],
+                'missing': [app_id for app_id in app_ids if app_id not in found]
+            }
+        except Exception as e:
+            # Log an error if the retrieval fails
+            self.logger.error(f'Error fetching the apps by ID from the database: {e}')
+            return jsonify({'error': f'Error fetching the apps by ID from the database: {e}'}), 500
+
     def get_app_by_name(self, name):
         try:
-            # Retrieve the app by its name
-            app = self.db_conn.db.apps.find_one({'name': name})
+            # Serve the app from the cache when possible
+            key = name_key(name)
+            app = self.cache_get(f'name:{key}')
+            if app is not None:
+                return app
+
+            # Retrieve the app by its normalized name, an equality match on the name_key index
+            app = self.db_conn.db.apps.find_one({'name_key': key})
+            self.cache_set(app)
             return app
         except Exception as e:
             # Log an error if the retrieval fails
@@ -72,14 +344,33 @@ class AppService:
             existing_app = self.get_app_by_id(app_id)
 
             if existing_app:
-                # Perform the update operation
-                result = self.db_conn.db.apps.update_one({'_id': app_id}, {'$set': updated_app})
-                if result.modified_count > 0:
+                if 'name' in updated_app:
+                    # A new name must not clash with another app, whatever its case
+                    updated_app['name_key'] = name_key(updated_app['name'])
+                    other = self.db_conn.db.apps.find_one({'name_key': updated_app['name_key'], '_id': {'$ne': app_id}}, {'_id': 1})
+                    if other:
+                        return jsonify({'error': 'App already exists'}), 400
+
+                # Perform the update operation, the app as it was tells which author lost it
+                previous_app = self.db_conn.db.apps.find_one_and_update(
+                    {'_id': app_id}, {'$set': updated_app}, return_document=ReturnDocument.BEFORE)
+                if previous_app is None:
+                    return None
+
+                # Forget the old entry, including the old name if it changed
+                self.cache_invalidate(existing_app, previous_app, {'name': updated_app.get('name')})
+                if 'author' in updated_app and updated_app['author'] != previous_app.get('author'):
+                    self.count_author_app(previous_app.get('author'), -1)
+                    self.count_author_app(updated_app['author'], 1)
+
+                if any(previous_app.get(field) != value for field, value in updated_app.items()):
                     return updated_app
                 else:
                     return 'The app is already up-to-date'
             else:
                 return None
+        except DuplicateKeyError:
+            return jsonify({'error': 'App already exists'}), 400
         except Exception as e:
             # Log an error if the update fails
             self.logger.error(f'Error updating the app: {e}')
@@ -87,12 +378,15 @@ class AppService:
 
     def delete_app(self, app_id):
         try:
-            # Check if the app exists before deleting
-            existing_app = self.get_app_by_id(app_id)
+            # Delete the app and get it back in one step, so only one request can decrement the count
+            existing_app = self.db_conn.db.apps.find_one_and_delete({'_id': app_id})
 
             if existing_app:
-                # Perform the delete operation
-                self.db_conn.db.apps.delete_one({'_id': app_id})
+                self.count_author_app(existing_app.get('author'), -1)
+                # Drop its own list and take it out of every other list, through the similar_id index
+                self.db_conn.db.similar_apps.delete_one({'_id': app_id})
+                self.db_conn.db.similar_apps.update_many({'similar._id': app_id}, {'$pull': {'similar': {'_id': app_id}}})
+                self.cache_invalidate(existing_app)
                 return existing_app
             else:
                 return None
@@ -0,0 +1,197 @@
+import sys
+import argparse
+import datetime
+from array import array
+from pymongo import ReplaceOne
+from logger.logger_apps import Logger
+
+DEFAULT_TOP_N = 20  # Similar apps stored per app
+DEFAULT_MIN_CO_LIKES = 2  # Pairs liked together by fewer users are noise
+DEFAULT_BLOCK_SIZE = 2048  # Apps whose co-like counts are computed at once, bounds the memory
+DEFAULT_BATCH_SIZE = 10000  # Users fetched per round trip
+JOB_ID = 'similar_apps'  # Document of the job in the job_runs collection
+CLOCK_SKEW = datetime.timedelta(minutes=1)  # likes_updated_at is set by the server clock, look back a bit further
+
+def load_scientific_stack():
+    # numpy and scipy are only needed by the batch job, not by the services
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError:
+        raise ValueError('The numpy and scipy packages are required to build the similar apps')
+    return numpy, sparse
+
+def like_matrix(users, columns):
+    # Sparse users x apps matrix with a 1 for every like, columns maps an app ID to its column
+    numpy, sparse = load_scientific_stack()
+    indptr, indices = array('q', [0]), array('i')
+    for user in users:
+        liked = {columns[app_id] for app_id in user.get('likedApps', []) if app_id in columns}
+        indices.extend(sorted(liked))
+        indptr.append(len(indices))
+
+    indices = numpy.frombuffer(indices, dtype=numpy.int32) if indices else numpy.zeros(0, dtype=numpy.int32)
+    data = numpy.ones(len(indices), dtype=numpy.float32)
+    return sparse.csr_matrix((data, indices, numpy.frombuffer(indptr, dtype=numpy.int64)),
+                             shape=(len(indptr) - 1, len(columns)))
+
+def top_similar(matrix, app_ids, counts, targets, top_n=DEFAULT_TOP_N, min_co_likes=DEFAULT_MIN_CO_LIKES,
+                block_size=DEFAULT_BLOCK_SIZE):
+    # Yield (app ID, similar apps) for every target column. Co-like counts come from matrix.T @ matrix one
+    # block of columns at a time, the score is the cosine similarity co_likes / sqrt(likes_a * likes_b)
+    numpy, _ = load_scientific_stack()
+    by_app = matrix.T.tocsr()
+    by_column = matrix.tocsc()
+    counts = numpy.asarray(counts, dtype=numpy.float64)
+
+    for start in range(0, len(targets), block_size):
+        block = targets[start:start + block_size]
+        co_likes = (by_app @ by_column[:, block]).tocsc()
+
+        for position, column in enumerate(block):
+            rows = co_likes.indices[co_likes.indptr[position]:co_likes.indptr[position + 1]]
+            values = co_likes.data[co_likes.indptr[position]:co_likes.indptr[position + 1]]
+            keep = (rows != column) & (values >= min_co_likes)
+            rows, values = rows[keep], values[keep]
+            if not len(rows):
+                yield app_ids[column], []
+                continue
+
+            # like_count can lag behind the likes read from the users, keep both factors at least 1
+            scores = values / numpy.sqrt(numpy.maximum(counts[rows], 1) * max(counts[column], 1))
+            if len(scores) > top_n:
+                best = numpy.argpartition(-scores, top_n - 1)[:top_n]
+                rows, values, scores = rows[best], values[best], scores[best]
+            order = numpy.argsort(-scores, kind='stable')
+
+            yield app_ids[column], [
+                {'_id': app_ids[rows[i]], 'score': round(float(scores[i]), 4), 'co_likes': int(values[i])}
+                for i in order
+            ]
+
+class SimilarAppsBuilder:
+    # Precomputes "users who liked X also liked" lists into the similar_apps collection
+    def __init__(self, db_conn, top_n=DEFAULT_TOP_N, min_co_likes=DEFAULT_MIN_CO_LIKES, batch_size=DEFAULT_BATCH_SIZE):
+        self.logger = Logger()
+        self.db_conn = db_conn
+        self.top_n = top_n
+        self.min_co_likes = min_co_likes
+        self.batch_size = batch_size
+
+    def save(self, results, built_at):
+        # Replace the list of every app, in batches of one round trip each
+        batch, saved = [], 0
+        for app_id, similar in results:
+            batch.append(ReplaceOne({'_id': app_id}, {'similar': similar, 'built_at': built_at}, upsert=True))
+            if len(batch) >= self.batch_size:
+                self.db_conn.db.similar_apps.bulk_write(batch, ordered=False)
+                saved += len(batch)
+                batch = []
+        if batch:
+            self.db_conn.db.similar_apps.bulk_write(batch, ordered=False)
+            saved += len(batch)
+        return saved
+
+    def build_all(self):
+        # Read every like once and recompute the lists of every app
+        numpy, _ = load_scientific_stack()
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+
+        app_ids = [app['_id'] for app in self.db_conn.db.apps.find({}, {'_id': 1}).sort('_id', 1)]
+        columns = {app_id: column for column, app_id in enumerate(app_ids)}
+        users = self.db_conn.db.users.find({'likedApps.0': {'$exists': True}}, {'likedApps': 1}).batch_size(self.batch_size)
+        matrix = like_matrix(users, columns)
+        self.logger.info(f'Like matrix loaded: {matrix.shape[0]} users, {matrix.shape[1]} apps, {matrix.nnz} likes')
+
+        counts = numpy.asarray(matrix.sum(axis=0)).ravel()
+        targets = [column for column in range(len(app_ids)) if counts[column] > 0]
+        saved = self.save(top_similar(matrix, app_ids, counts, targets, self.top_n, self.min_co_likes), started_at)
+
+        # Lists of apps that lost all their likes or were deleted are left over from older builds
+        self.db_conn.db.similar_apps.delete_many({'built_at': {'$lt': started_at}})
+        self.record_run(started_at, 'full', saved)
+        return saved
+
+    def affected_by(self, changed):
+        # A like on X moves the co-likes of X with every app its users like, so those lists are recomputed too,
+        # along with the lists still naming X after the pair lost its last common user
+        affected = set(changed)
+        for start in range(0, len(changed), DEFAULT_BLOCK_SIZE):
+            chunk = changed[start:start + DEFAULT_BLOCK_SIZE]
+            for user in self.db_conn.db.users.find({'likedApps': {'$in': chunk}}, {'likedApps': 1}).batch_size(self.batch_size):
+                affected.update(user['likedApps'])
+            affected.update(doc['_id'] for doc in self.db_conn.db.similar_apps.find({'similar._id': {'$in': chunk}}, {'_id': 1}))
+        return sorted(affected)
+
+    def build_changed(self, since):
+        # Only recompute the apps whose likes changed since the last run and their neighbours. Every user who
+        # likes one of them is read through the likedApps index, which is enough to count its co-likes exactly
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+
+        query = {'likes_updated_at': {'$gte': since - CLOCK_SKEW}}
+        changed = self.affected_by([app['_id'] for app in self.db_conn.db.apps.find(query, {'_id': 1})])
+        saved = 0
+        for start in range(0, len(changed), DEFAULT_BLOCK_SIZE):
+            chunk = changed[start:start + DEFAULT_BLOCK_SIZE]
+            users = list(self.db_conn.db.users.find({'likedApps': {'$in': chunk}}, {'likedApps': 1}))
+
+            # Columns for every app these users like, with the likes of the whole catalog from like_count
+            apps = self.db_conn.db.apps.find(
+                {'_id': {'$in': list({app_id for user in users for app_id in user['likedApps']})}}, {'like_count': 1})
+            counts_by_app = {app['_id']: app.get('like_count', 0) for app in apps}
+            app_ids = list(counts_by_app)
+            columns = {app_id: column for column, app_id in enumerate(app_ids)}
+            counts = [counts_by_app[app_id] for app_id in app_ids]
+
+            matrix = like_matrix(users, columns)
+            targets = [columns[app_id] for app_id in chunk if app_id in columns]
+            saved += self.save(top_similar(matrix, app_ids, counts, targets, self.top_n, self.min_co_likes), started_at)
+
+            # Apps nobody likes anymore, or deleted since, have no list
+            unliked = [app_id for app_id in chunk if app_id not in columns]
+            if unliked:
+                self.db_conn.db.similar_apps.delete_many({'_id': {'$in': unliked}})
+
+        self.record_run(started_at, 'incremental', saved)
+        return saved
+
+    def last_run(self):
+        run = self.db_conn.db.job_runs.find_one({'_id': JOB_ID})
+        return run['started_at'] if run else None
+
+    def record_run(self, started_at, mode, saved):
+        # The next incremental run picks up the likes from the start of this one, nothing falls in between
+        self.db_conn.db.job_runs.update_one({'_id': JOB_ID}, {'$set': {
+            'started_at': started_at, 'finished_at': datetime.datetime.now(datetime.timezone.utc),
+            'mode': mode, 'apps': saved
+        }}, upsert=True)
+
+
+if __name__ == '__main__':
+    from models.app_models import AppModel
+
+    parser = argparse.ArgumentParser(description='Build the similar apps lists from the users likes')
+    parser.add_argument('--full', action='store_true', help='Rebuild every list instead of the apps liked since the last run')
+    parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N, help='Similar apps stored per app')
+    parser.add_argument('--min-co-likes', type=int, default=DEFAULT_MIN_CO_LIKES, help='Users needed to link two apps')
+    args = parser.parse_args()
+
+    db_conn = AppModel()
+    builder = SimilarAppsBuilder(db_conn, args.top_n, args.min_co_likes)
+    exit_code = 0
+
+    try:
+        db_conn.connect_to_database()
+        since = builder.last_run()
+        started = datetime.datetime.now()
+        if args.full or since is None:
+            saved = builder.build_all()
+        else:
+            saved = builder.build_changed(since)
+        builder.logger.info(f'{saved} similar apps lists saved in {datetime.datetime.now() - started}')
+    except Exception as e:
+        builder.logger.critical(f'Error building the similar apps: {e}')
+        exit_code = 1
+    finally:
+        db_conn.close_connection()
+    sys.exit(exit_code)
@@ -0,0 +1,78 @@
+import os
+import sys
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.app_cache import LRUCache, RedisCache
+
+class FakeRedis:
+    # Stores the raw bytes like Redis does, enough for RedisCache
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode() if isinstance(value, str) else value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def mget(self, keys):
+        self.round_trips = getattr(self, 'round_trips', 0) + 1
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value, ex))
+
+    def execute(self):
+        self.client.round_trips = getattr(self.client, 'round_trips', 0) + 1
+        for command in self.commands:
+            self.client.set(*command)
+
+def test_redis_cache_round_trips_a_liked_app():
+    # like_count_update sets likes_updated_at with $currentDate, the cache must keep the datetime
+    liked_at = datetime.datetime(2026, 10, 18, 12, 30, 15, 123000)
+    app = {'_id': 7, 'name': 'Notes', 'name_key': 'notes', 'author': 3, 'like_count': 2, 'likes_updated_at': liked_at}
+    cache = RedisCache('redis://unused', client=FakeRedis())
+
+    cache.set('id:7', app)
+
+    assert cache.get('id:7') == app
+    assert cache.stats()['hits'] == 1
+
+def test_redis_cache_miss():
+    cache = RedisCache('redis://unused', client=FakeRedis())
+
+    assert cache.get('id:8') is None
+    assert cache.stats()['misses'] == 1
+
+def test_redis_cache_many_in_one_round_trip_each():
+    client = FakeRedis()
+    cache = RedisCache('redis://unused', client=client)
+
+    cache.set_many({'id:1': {'_id': 1}, 'id:2': {'_id': 2}})
+    found = cache.get_many(['id:1', 'id:2', 'id:3'])
+
+    assert found == {'id:1': {'_id': 1}, 'id:2': {'_id': 2}}
+    assert client.round_trips == 2
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+def test_lru_cache_many():
+    cache = LRUCache(max_size=2)
+
+    cache.set_many({'id:1': {'_id': 1}, 'id:2': {'_id': 2}, 'id:3': {'_id': 3}})
+
+    assert cache.get_many(['id:1', 'id:2', 'id:3']) == {'id:2': {'_id': 2}, 'id:3': {'_id': 3}}
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,5 @@
+from app import create_app  # Import the application factory
+
+# Gunicorn imports this module in every worker after the fork (preload_app is off),
+# so each worker builds its own app and its own MongoClient pool
+app = create_app()
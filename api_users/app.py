@@ -1,24 +1,28 @@
-from flask import Flask
+import os
+from common.factory import create_app as create_service_app
+from common.tracing import Traced
 from models.user_models import UserModel
 from services.user_services import UserService
 from schemas.user_schemas import UserSchema
 from routes.user_routes import UserRoutes
-from flasgger import Swagger
-from flask_cors import CORS
 
-app = Flask(__name__)
-CORS(app)
+def build_blueprints(db_conn):
+    user_service = UserService(db_conn, id_block_size=int(os.environ.get('ID_BLOCK_SIZE', 1)))
+    user_schema = UserSchema()
+    return [UserRoutes(Traced(user_service, 'service'), Traced(user_schema, 'validation'))]
 
-swagger = Swagger(app)
-db_conn = UserModel()
-db_conn.connect_to_database()
-user_service = UserService(db_conn)
-user_schema = UserSchema()
-user_routes = UserRoutes(user_service, user_schema)
-app.register_blueprint(user_routes)
+def create_app():
+    # Every process that calls create_app gets its own MongoClient
+    return create_service_app({
+        'NAME': __name__,
+        'SERVICE': 'users',
+        'MODEL': UserModel,
+        'BLUEPRINTS': build_blueprints
+    })
 
 if __name__ == '__main__':
+    app = create_app()
     try:
         app.run(port=8000, debug=True)
     finally:
-        db_conn.close_connection()
+        app.extensions['db_conn'].close_connection()
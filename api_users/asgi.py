@@ -0,0 +1,35 @@
+import os
+from quart import Quart
+from quart_cors import cors
+from common.config import default_config
+from models.user_models_async import AsyncUserModel
+from services.user_services_async import AsyncUserService
+from schemas.user_schemas import UserSchema
+from routes.user_routes_async import AsyncUserRoutes
+
+def create_app():
+    # ASGI variant of the users service, run it with e.g. `hypercorn asgi:app` or `uvicorn asgi:app`
+    app = cors(Quart(__name__))
+    app.config.update(default_config())
+
+    db_conn = AsyncUserModel()
+    user_service = AsyncUserService(db_conn, id_block_size=int(os.environ.get('ID_BLOCK_SIZE', 1)))
+    user_schema = UserSchema()
+    user_routes = AsyncUserRoutes(user_service, user_schema)
+    app.register_blueprint(user_routes)
+
+    # The motor client must be created inside the event loop of the server
+    @app.before_serving
+    async def connect():
+        await db_conn.connect_to_database()
+
+    @app.after_serving
+    async def close():
+        db_conn.close_connection()
+
+    return app
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(port=8000, debug=True)
@@ -1,52 +1,39 @@
-import os
+import sys
+import argparse
+from common.models import MongoModel
 from logger.logger_users import Logger
-from pymongo import MongoClient
+from pymongo import ASCENDING, IndexModel
 
-class UserModel:
+# Indexes needed by the hot queries of the users service, keyed by collection
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        IndexModel([('likedApps', ASCENDING)], name='liked_apps'),  # Users who like an app, like count recounts
+    ],
+}
+
+class UserModel(MongoModel):
     def __init__(self):
-        self.client = None
-        self.db = None
-        self.logger = Logger()
-    
-    def connect_to_database(self):
-        mongodb_user = os.environ.get('MONGODB_USER')
-        mongodb_pass = os.environ.get('MONGODB_PASS')
-        mongodb_host = os.environ.get('MONGODB_HOST')
-        
-        if not mongodb_user or not mongodb_pass or not mongodb_host:
-            self.logger.critical('MongoDB environment variables are required')
-            raise ValueError('Set environment MONGODB_USER, MONGODB_PASS, MONGODB_HOST')
-        
-        try:
-            self.client = MongoClient(
-                host = mongodb_host,
-                port = 27017,
-                username = mongodb_user,
-                password = mongodb_pass,
-                authSource = 'admin',
-                authMechanism = 'SCRAM-SHA-256',
-                serverSelectionTimeoutMS = 5000
-            )
-            self.db = self.client['microservices']
-            if self.db.list_collection_names():
-                self.logger.info('Connected to MongoDB database successfully')
-        except Exception as e:
-            self.logger.critical(f'Failed to connect to the database: {e}')
-            raise
-        
-    def close_connection(self):
-        if self.client:
-            self.client.close()
+        super().__init__(Logger(), INDEXES)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Users database connection')
+    parser.add_argument('--ensure-indexes', action='store_true', help='Create the users indexes and exit')
+    args = parser.parse_args()
+
     db_conn = UserModel()
     logger = Logger()
+    exit_code = 0
     
     try:
-        db_conn.connect_to_database()
+        db_conn.connect_to_database(create_indexes=False)
+        if args.ensure_indexes:
+            db_conn.ensure_indexes()
     except Exception as e:
         logger.critical(f'An error occurred: {e}')
+        exit_code = 1
     finally:
         db_conn.close_connection()
-        logger.info('Connection to the database was successfully closed')
\ No newline at end of file
+        logger.info('Connection to the database was successfully closed')
+    sys.exit(exit_code)
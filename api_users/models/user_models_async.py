@@ -0,0 +1,44 @@
+import time
+import asyncio
+from common.models import PoolStats, mongo_client_options
+from logger.logger_users import Logger
+from motor.motor_asyncio import AsyncIOMotorClient
+from models.user_models import INDEXES
+
+class AsyncUserModel:
+    # Same connection as UserModel on the motor driver, for the ASGI users service
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.logger = Logger()
+        self.pool_stats = PoolStats()
+
+    async def connect_to_database(self, create_indexes=True):
+        try:
+            self.client = AsyncIOMotorClient(**mongo_client_options(self.logger), event_listeners=[self.pool_stats])
+            self.db = self.client['microservices']
+            if await self.db.list_collection_names():
+                self.logger.info('Connected to MongoDB database successfully')
+        except Exception as e:
+            self.logger.critical(f'Failed to connect to the database: {e}')
+            raise
+
+        if create_indexes:
+            try:
+                await self.ensure_indexes()
+            except Exception as e:
+                self.logger.error(f'Failed to create the database indexes: {e}')
+
+    async def ping(self, timeout):
+        started = time.perf_counter()
+        await asyncio.wait_for(self.db.command('ping'), timeout)
+        return time.perf_counter() - started
+
+    async def ensure_indexes(self):
+        for collection, indexes in INDEXES.items():
+            names = await self.db[collection].create_indexes(indexes)
+            self.logger.info(f'Indexes ready on {collection}: {names}')
+
+    def close_connection(self):
+        if self.client:
+            self.client.close()
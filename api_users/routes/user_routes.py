@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, request, make_response
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from marshmallow import ValidationError
 from logger.logger_users import Logger
 from flasgger import swag_from
+from services.user_services import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LIKED_PAGE_SIZE, MAX_LIKE_BATCH, MAX_LIKED_PAGE_SIZE, LikeStatus, LoginStatus
+)
 
 class UserRoutes(Blueprint):
     def __init__(self, user_service, user_schema):
@@ -17,17 +20,43 @@ class UserRoutes(Blueprint):
         self.route('/api/v1/users/login', methods=['GET'])(self.get_login_user)
         self.route("/api/v1/users/like", methods=["GET"])(self.liked_apps)
         self.route('/api/v1/users/like', methods=['POST'])(self.like_app)
+        self.route('/api/v1/users/like', methods=['DELETE'])(self.unlike_app)
+        self.route('/api/v1/users/like/batch', methods=['POST'])(self.like_apps_batch)
         self.route('/api/v1/users/<int:user_id>', methods=['PUT'])(self.update_user)
         self.route('/api/v1/users/<int:user_id>', methods=['DELETE'])(self.delete_user)
         self.route('/api/v1/users/<int:user_id>', methods=['GET'])(self.get_user_by_id)
-        self.route('/healthcheck', methods=['GET'])(self.healthcheck)
 
     @swag_from({
         'tags': ['Users'],
         'parameters': [
             {
-                '_id': 'user_id',
-            }   
+                'name': 'user_id',
+                'in': 'query',
+                'required': True,
+                'type': 'integer'
+            },
+            {
+                'name': 'expand',
+                'in': 'query',
+                'required': False,
+                'type': 'string',
+                'enum': ['apps'],
+                'description': 'Return the liked app documents instead of their IDs'
+            },
+            {
+                'name': 'offset',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': 'Liked apps to skip when expanded'
+            },
+            {
+                'name': 'limit',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': f'Liked apps per page when expanded (max {MAX_LIKED_PAGE_SIZE})'
+            }
         ],
         'responses': {
             200: {
@@ -39,6 +68,9 @@ class UserRoutes(Blueprint):
             402: {
                 'description': 'Validation failed'
             },
+            403: {
+                'description': 'Invalid offset or limit'
+            },
             400: {
                 'description': 'User does not exist'
             },
@@ -58,15 +90,27 @@ class UserRoutes(Blueprint):
                 self.user_schema.validate_id(str(user_id))
             except ValidationError as e:
                 return jsonify({'error': f'Validation failed: {e}'}), 402
-            
-            user = self.user_service.get_user_by_id(user_id)
-            if user is None:
+
+            if request.args.get('expand') == 'apps':
+                try:
+                    offset = int(request.args.get('offset', 0))
+                    limit = int(request.args.get('limit', DEFAULT_LIKED_PAGE_SIZE))
+                except ValueError:
+                    return jsonify({'error': 'Invalid offset or limit, they must be integers'}), 403
+                if offset < 0 or limit < 1 or limit > MAX_LIKED_PAGE_SIZE:
+                    return jsonify({'error': f'Invalid offset or limit, limit must be between 1 and {MAX_LIKED_PAGE_SIZE}'}), 403
+
+                liked_apps = self.user_service.get_liked_apps_expanded(user_id, offset, limit)
+            else:
+                liked_apps = self.user_service.get_liked_apps(user_id)
+
+            if liked_apps is None:
                 return jsonify({'error': 'User does not exist'}), 400
-            
-            liked_apps = self.user_service.get_liked_apps(user_id)
-            user['likedApps'] = liked_apps
 
-            return jsonify(user['likedApps']), 201
+            if isinstance(liked_apps, tuple):
+                return liked_apps
+
+            return jsonify(liked_apps), 201
         except Exception as e:
             self.logger.error(f'Error fetching liked apps: {e}')
             return jsonify({'error': f'Error fetching liked apps: {e}'}), 505
@@ -90,7 +134,7 @@ class UserRoutes(Blueprint):
         ],
         'responses': {
             200: {
-                'description': 'App successfully liked'
+                'description': 'App successfully liked, or already liked'
             },
             401: {
                 'description': 'Invalid data, empty'
@@ -98,6 +142,9 @@ class UserRoutes(Blueprint):
             402: {
                 'description': 'Validation failed'
             },
+            403: {
+                'description': 'Invalid app ID'
+            },
             400: {
                 'description': 'User does not exist'
             },
@@ -125,24 +172,180 @@ class UserRoutes(Blueprint):
             except ValidationError as e:
                 return jsonify({'error': f'Validation failed: {e}'}), 403
 
-            user = self.user_service.like_app(user_id, app_id)
-            if user is None:
+            status = self.user_service.like_app(user_id, app_id)
+            if isinstance(status, tuple):
+                return status
+
+            if status is LikeStatus.USER_NOT_FOUND:
                 return jsonify({'error': 'User does not exist'}), 400
-            
-            if isinstance(user, str):
-                return jsonify({'message': 'Successfully saved app'}), 200
 
-            return make_response(user)
+            if status is LikeStatus.UNCHANGED:
+                return jsonify({'message': 'User already saved that app'}), 200
+
+            return jsonify({'message': 'Successfully saved app'}), 200
         except Exception as e:
             self.logger.error(f'Error liking app: {e}')
             return jsonify({'error': f'Error liking app: {e}'}), 500
 
     @swag_from({
         'tags': ['Users'],
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'object',
+                    'properties': {
+                        'user_id': {'type': 'integer'},
+                        'app_id': {'type': 'integer'}
+                    },
+                    'required': ['user_id', 'app_id']
+                }
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'App successfully unliked'
+            },
+            401: {
+                'description': 'Invalid data, empty'
+            },
+            402: {
+                'description': 'Validation failed'
+            },
+            400: {
+                'description': 'User does not exist'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def unlike_app(self):
+        try:
+            request_data = request.json
+            if not request_data:
+                return jsonify({'error': 'Invalid data, empty'}), 401
+
+            user_id = int(request_data.get('user_id'))
+            app_id = int(request_data.get('app_id'))
+
+            try:
+                self.user_schema.validate_id(str(user_id))
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 402
+
+            try:
+                self.user_schema.validate_id(str(app_id))
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 403
+
+            status = self.user_service.unlike_app(user_id, app_id)
+            if isinstance(status, tuple):
+                return status
+
+            if status is LikeStatus.USER_NOT_FOUND:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if status is LikeStatus.UNCHANGED:
+                return jsonify({'message': 'User had not saved that app'}), 200
+
+            return jsonify({'message': 'Successfully removed app'}), 200
+        except Exception as e:
+            self.logger.error(f'Error unliking app: {e}')
+            return jsonify({'error': f'Error unliking app: {e}'}), 500
+
+    @swag_from({
+        'tags': ['Users'],
+        'parameters': [
+            {
+                'name': 'body',
+                'in': 'body',
+                'required': True,
+                'schema': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'user_id': {'type': 'integer'},
+                            'app_id': {'type': 'integer'},
+                            'op': {'type': 'string', 'enum': ['like', 'unlike']}
+                        },
+                        'required': ['user_id', 'app_id', 'op']
+                    }
+                }
+            }
+        ],
+        'responses': {
+            200: {
+                'description': 'Result of every item of the batch, in the order they were sent: done, unchanged, '
+                               'user_not_found, superseded, failed or invalid'
+            },
+            401: {
+                'description': 'Invalid data, empty'
+            },
+            413: {
+                'description': 'Too many items in the batch'
+            },
+            500: {
+                'description': 'Internal server error'
+            }
+        }
+    })
+    def like_apps_batch(self):
+        try:
+            items = request.json
+            if not items or not isinstance(items, list):
+                return jsonify({'error': 'Invalid data, empty'}), 401
+
+            if len(items) > MAX_LIKE_BATCH:
+                return jsonify({'error': f'A batch must not exceed {MAX_LIKE_BATCH} items'}), 413
+
+            likes, errors = self.user_schema.validate_likes(items)
+
+            response = self.user_service.apply_likes(likes)
+            if isinstance(response, tuple):
+                return response
+
+            results = response['results']
+            for index, messages in errors.items():
+                results[index] = {'status': 'invalid', 'error': messages}
+
+            return jsonify({
+                'results': [results[index] for index in range(len(items))],
+                'matched': response['matched'],
+                'modified': response['modified']
+            }), 200
+        except Exception as e:
+            self.logger.error(f'Error applying likes batch: {e}')
+            return jsonify({'error': f'Error applying likes batch: {e}'}), 500
+
+    @swag_from({
+        'tags': ['Users'],
+        'parameters': [
+            {
+                'name': 'stream',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': 'Stream every user as NDJSON (same as Accept: application/x-ndjson)'
+            },
+            {
+                'name': 'batch_size',
+                'in': 'query',
+                'required': False,
+                'type': 'integer',
+                'description': 'Users fetched per database round trip when streaming'
+            }
+        ],
         'responses': {
             200: {
                 'description': 'List of all users'
             },
+            400: {
+                'description': 'Invalid batch_size'
+            },
             500: {
                 'description': 'Internal server error'
             }
@@ -150,12 +353,40 @@ class UserRoutes(Blueprint):
     })
     def get_users(self):
         try:
+            if self.wants_stream():
+                try:
+                    batch_size = int(request.args.get('batch_size', DEFAULT_BATCH_SIZE))
+                except ValueError:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+                if batch_size < 1:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+
+                cursor = self.user_service.stream_all_users(batch_size)
+                return self.ndjson_response(cursor)
+
             users = self.user_service.get_all_users()
             return jsonify(users), 200
         except Exception as e:
             self.logger.error(f'Error fetching users: {e}')
             return jsonify({'error': f'Error fetching users: {e}'}), 500
 
+    def wants_stream(self):
+        # NDJSON is requested with ?stream=1 or through the Accept header
+        if request.args.get('stream') in ('1', 'true'):
+            return True
+        return request.accept_mimetypes.best == 'application/x-ndjson'
+
+    def ndjson_response(self, cursor):
+        def generate():
+            try:
+                # Send every user as soon as its batch arrives
+                for document in cursor:
+                    yield current_app.json.dumps(document) + '\n'
+            finally:
+                cursor.close()
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     @swag_from({
         'tags': ['Users'],
         'parameters': [
@@ -180,6 +411,12 @@ class UserRoutes(Blueprint):
             400: {
                 'description': 'Invalid data or user does not exist'
             },
+            403: {
+                'description': 'Wrong password'
+            },
+            404: {
+                'description': 'User does not exist'
+            },
             500: {
                 'description': 'Internal server error'
             }
@@ -204,16 +441,13 @@ class UserRoutes(Blueprint):
             except ValidationError as e:
                 return jsonify({'error': f'Validation failed: {e}'}), 402
 
-            user_exists = self.user_service.check_user_exists(email)
-            if user_exists:
-                user = self.user_service.get_user_by_email(email, password)
-                if (len(user) > 1):
-                    return user
-                else:
-                    user[1] = ""
-                    return jsonify(user), 200
-            else:
+            result = self.user_service.login(email, password)
+            if result.status is LoginStatus.USER_NOT_FOUND:
                 return jsonify({'error': 'User does not exist'}), 404
+            if result.status is LoginStatus.WRONG_PASSWORD:
+                return jsonify({'error': 'Wrong password'}), 403
+
+            return jsonify(result.user), 200
         except Exception as e:
             self.logger.error(f'Error fetching user: {e}')
             return jsonify({'error': f'Error fetching user: {e}'}), 500
@@ -271,6 +505,9 @@ class UserRoutes(Blueprint):
                 'password': password
             }
             created_user = self.user_service.add_user(new_user)
+            if isinstance(created_user, tuple):
+                return created_user
+
             self.logger.info(f'User created: {created_user}')
             return jsonify(created_user), 201
         except Exception as e:
@@ -414,6 +651,3 @@ class UserRoutes(Blueprint):
         except Exception as e:
             self.logger.error(f'Error fetching user by ID: {e}')
             return jsonify({'error': f'Error fetching user by ID: {e}'}), 500
-
-    def healthcheck(self):
-        return jsonify({'status': 'up'}), 200
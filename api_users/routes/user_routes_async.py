@@ -0,0 +1,339 @@
+from quart import Blueprint, current_app, jsonify, request
+from marshmallow import ValidationError
+from logger.logger_users import Logger
+from services.user_services import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LIKED_PAGE_SIZE, MAX_LIKE_BATCH, MAX_LIKED_PAGE_SIZE, LikeStatus, LoginStatus
+)
+
+class AsyncUserRoutes(Blueprint):
+    # Same URLs, validation and status codes as UserRoutes, served by Quart on an ASGI server
+    def __init__(self, user_service, user_schema):
+        super().__init__('user', __name__)
+        self.user_service = user_service
+        self.user_schema = user_schema
+        self.register_routes()
+        self.logger = Logger()
+
+    def register_routes(self):
+        self.route('/api/v1/users', methods=['GET'])(self.get_users)
+        self.route("/api/v1/users", methods=["POST"])(self.add_user)
+        self.route('/api/v1/users/login', methods=['GET'])(self.get_login_user)
+        self.route("/api/v1/users/like", methods=["GET"])(self.liked_apps)
+        self.route('/api/v1/users/like', methods=['POST'])(self.like_app)
+        self.route('/api/v1/users/like', methods=['DELETE'])(self.unlike_app)
+        self.route('/api/v1/users/like/batch', methods=['POST'])(self.like_apps_batch)
+        self.route('/api/v1/users/<int:user_id>', methods=['PUT'])(self.update_user)
+        self.route('/api/v1/users/<int:user_id>', methods=['DELETE'])(self.delete_user)
+        self.route('/api/v1/users/<int:user_id>', methods=['GET'])(self.get_user_by_id)
+        self.route('/healthcheck', methods=['GET'])(self.healthcheck)
+        self.route('/livez', methods=['GET'])(self.healthcheck)
+        self.route('/readyz', methods=['GET'])(self.readyz)
+
+    async def liked_apps(self):
+        try:
+            user_id = int(request.args.get('user_id'))
+            if not user_id:
+                return jsonify({'error': 'Invalid user or empty'}), 401
+
+            try:
+                self.user_schema.validate_id(str(user_id))
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 402
+
+            if request.args.get('expand') == 'apps':
+                try:
+                    offset = int(request.args.get('offset', 0))
+                    limit = int(request.args.get('limit', DEFAULT_LIKED_PAGE_SIZE))
+                except ValueError:
+                    return jsonify({'error': 'Invalid offset or limit, they must be integers'}), 403
+                if offset < 0 or limit < 1 or limit > MAX_LIKED_PAGE_SIZE:
+                    return jsonify({'error': f'Invalid offset or limit, limit must be between 1 and {MAX_LIKED_PAGE_SIZE}'}), 403
+
+                liked_apps = await self.user_service.get_liked_apps_expanded(user_id, offset, limit)
+            else:
+                liked_apps = await self.user_service.get_liked_apps(user_id)
+
+            if liked_apps is None:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if isinstance(liked_apps, tuple):
+                return liked_apps
+
+            return jsonify(liked_apps), 201
+        except Exception as e:
+            self.logger.error(f'Error fetching liked apps: {e}')
+            return jsonify({'error': f'Error fetching liked apps: {e}'}), 505
+
+    async def parse_like(self):
+        # Read and validate the user and app of a like or unlike, returns (ids, error response)
+        request_data = await request.get_json()
+        if not request_data:
+            return None, (jsonify({'error': 'Invalid data, empty'}), 401)
+
+        user_id = int(request_data.get('user_id'))
+        app_id = int(request_data.get('app_id'))
+
+        try:
+            self.user_schema.validate_id(str(user_id))
+        except ValidationError as e:
+            return None, (jsonify({'error': f'Validation failed: {e}'}), 402)
+
+        try:
+            self.user_schema.validate_id(str(app_id))
+        except ValidationError as e:
+            return None, (jsonify({'error': f'Validation failed: {e}'}), 403)
+
+        return (user_id, app_id), None
+
+    async def like_app(self):
+        try:
+            ids, error = await self.parse_like()
+            if error:
+                return error
+
+            status = await self.user_service.like_app(*ids)
+            if isinstance(status, tuple):
+                return status
+
+            if status is LikeStatus.USER_NOT_FOUND:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if status is LikeStatus.UNCHANGED:
+                return jsonify({'message': 'User already saved that app'}), 200
+
+            return jsonify({'message': 'Successfully saved app'}), 200
+        except Exception as e:
+            self.logger.error(f'Error liking app: {e}')
+            return jsonify({'error': f'Error liking app: {e}'}), 500
+
+    async def unlike_app(self):
+        try:
+            ids, error = await self.parse_like()
+            if error:
+                return error
+
+            status = await self.user_service.unlike_app(*ids)
+            if isinstance(status, tuple):
+                return status
+
+            if status is LikeStatus.USER_NOT_FOUND:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if status is LikeStatus.UNCHANGED:
+                return jsonify({'message': 'User had not saved that app'}), 200
+
+            return jsonify({'message': 'Successfully removed app'}), 200
+        except Exception as e:
+            self.logger.error(f'Error unliking app: {e}')
+            return jsonify({'error': f'Error unliking app: {e}'}), 500
+
+    async def like_apps_batch(self):
+        try:
+            items = await request.get_json()
+            if not items or not isinstance(items, list):
+                return jsonify({'error': 'Invalid data, empty'}), 401
+
+            if len(items) > MAX_LIKE_BATCH:
+                return jsonify({'error': f'A batch must not exceed {MAX_LIKE_BATCH} items'}), 413
+
+            likes, errors = self.user_schema.validate_likes(items)
+
+            response = await self.user_service.apply_likes(likes)
+            if isinstance(response, tuple):
+                return response
+
+            results = response['results']
+            for index, messages in errors.items():
+                results[index] = {'status': 'invalid', 'error': messages}
+
+            return jsonify({
+                'results': [results[index] for index in range(len(items))],
+                'matched': response['matched'],
+                'modified': response['modified']
+            }), 200
+        except Exception as e:
+            self.logger.error(f'Error applying likes batch: {e}')
+            return jsonify({'error': f'Error applying likes batch: {e}'}), 500
+
+    async def get_users(self):
+        try:
+            if self.wants_stream():
+                try:
+                    batch_size = int(request.args.get('batch_size', DEFAULT_BATCH_SIZE))
+                except ValueError:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+                if batch_size < 1:
+                    return jsonify({'error': 'Invalid batch_size'}), 400
+
+                cursor = self.user_service.stream_all_users(batch_size)
+                return self.ndjson_response(cursor)
+
+            users = await self.user_service.get_all_users()
+            if isinstance(users, tuple):
+                return users
+            return jsonify(users), 200
+        except Exception as e:
+            self.logger.error(f'Error fetching users: {e}')
+            return jsonify({'error': f'Error fetching users: {e}'}), 500
+
+    def wants_stream(self):
+        if request.args.get('stream') in ('1', 'true'):
+            return True
+        return request.accept_mimetypes.best == 'application/x-ndjson'
+
+    def ndjson_response(self, cursor):
+        json = current_app.json
+
+        async def generate():
+            try:
+                async for document in cursor:
+                    yield (json.dumps(document) + '\n').encode()
+            finally:
+                cursor.close()
+
+        return generate(), 200, {'Content-Type': 'application/x-ndjson'}
+
+    async def get_login_user(self):
+        try:
+            email = request.args.get('email')
+            password = request.args.get('password')
+
+            if not email or not password:
+                return jsonify({'error': 'Invalid data or empty'}), 404
+
+            try:
+                self.user_schema.validate_email(email)
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 401
+
+            try:
+                self.user_schema.validate_password(password)
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 402
+
+            result = await self.user_service.login(email, password)
+            if result.status is LoginStatus.USER_NOT_FOUND:
+                return jsonify({'error': 'User does not exist'}), 404
+            if result.status is LoginStatus.WRONG_PASSWORD:
+                return jsonify({'error': 'Wrong password'}), 403
+
+            return jsonify(result.user), 200
+        except Exception as e:
+            self.logger.error(f'Error fetching user: {e}')
+            return jsonify({'error': f'Error fetching user: {e}'}), 500
+
+    async def add_user(self):
+        try:
+            request_data = await request.get_json()
+            if not request_data:
+                return jsonify({'error': 'Invalid data, empty'}), 401
+
+            email = request_data.get('email')
+            password = request_data.get('password')
+
+            try:
+                self.user_schema.validate_email(email)
+                self.user_schema.validate_password(password)
+            except ValidationError as e:
+                return jsonify({'error': f'Validation failed: {e}'}), 402
+
+            if await self.user_service.check_user_exists(email):
+                return jsonify({'error': 'User already exists'}), 403
+
+            new_user = {
+                'email': email,
+                'password': password
+            }
+            created_user = await self.user_service.add_user(new_user)
+            if isinstance(created_user, tuple):
+                return created_user
+
+            self.logger.info(f'User created: {created_user}')
+            return jsonify(created_user), 201
+        except Exception as e:
+            self.logger.error(f'Error creating user: {e}')
+            return jsonify({'error': f'Error creating user: {e}'}), 501
+
+    async def update_user(self, user_id):
+        try:
+            request_data = await request.get_json()
+            if not request_data:
+                return jsonify({'error': 'Invalid data, empty'}), 401
+
+            email = request_data.get('email')
+            password = request_data.get('password')
+
+            if email:
+                try:
+                    self.user_schema.validate_email(email)
+                except ValidationError as e:
+                    return jsonify({'error': f'Validation failed: {e}'}), 402
+
+            if password:
+                try:
+                    self.user_schema.validate_password(password)
+                except ValidationError as e:
+                    return jsonify({'error': f'Validation failed: {e}'}), 403
+
+            updated_user = {k: v for k, v in request_data.items() if v is not None}
+
+            result = await self.user_service.update_user(user_id, updated_user)
+            if result is None:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if isinstance(result, tuple):
+                return result
+
+            if isinstance(result, str):
+                return jsonify({'message': result}), 200
+
+            return jsonify({'message': 'User successfully updated', 'user': result}), 200
+        except Exception as e:
+            self.logger.error(f'Error updating user: {e}')
+            return jsonify({'error': f'Error updating user: {e}'}), 500
+
+    async def delete_user(self, user_id):
+        try:
+            user = await self.user_service.delete_user(user_id)
+            if user is None:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if isinstance(user, tuple):
+                return user
+
+            return jsonify({'message': 'User successfully deleted', 'user': user}), 200
+        except Exception as e:
+            self.logger.error(f'Error deleting user: {e}')
+            return jsonify({'error': f'Error deleting user: {e}'}), 500
+
+    async def get_user_by_id(self, user_id):
+        try:
+            user = await self.user_service.get_user_by_id(user_id)
+            if user is None:
+                return jsonify({'error': 'User does not exist'}), 400
+
+            if isinstance(user, tuple):
+                return user
+
+            return jsonify(user), 200
+        except Exception as e:
+            self.logger.error(f'Error fetching user by ID: {e}')
+            return jsonify({'error': f'Error fetching user by ID: {e}'}), 500
+
+    async def healthcheck(self):
+        return jsonify({'status': 'up'}), 200
+
+    async def readyz(self):
+        # Same readiness report as the Flask services, see common.factory
+        db_conn = self.user_service.db_conn
+        budget = current_app.config['READY_LATENCY_BUDGET_MS']
+        report = {'pool': db_conn.pool_stats.snapshot(), 'latency_budget_ms': budget}
+        try:
+            latency_ms = await db_conn.ping(current_app.config['READY_PING_TIMEOUT_MS'] / 1000) * 1000
+        except Exception as e:
+            return jsonify({**report, 'status': 'down', 'error': f'MongoDB ping failed: {e}'}), 503
+
+        report['ping_ms'] = round(latency_ms, 2)
+        if latency_ms > budget:
+            return jsonify({**report, 'status': 'degraded'}), 503
+        return jsonify({**report, 'status': 'ready'}), 200
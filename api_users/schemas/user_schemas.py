@@ -1,6 +1,31 @@
-from marshmallow import fields, validates, ValidationError, Schema
+from marshmallow import fields, validate, validates, ValidationError, Schema
 import re
 
+# Compiled once at import instead of on every request
+EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+def classify_password(value):
+    # Find digits, uppercase and lowercase letters in a single pass, stop once all three are seen
+    has_digit = has_upper = has_lower = False
+    for char in value:
+        if char.isdigit():
+            has_digit = True
+        elif char.isupper():
+            has_upper = True
+        elif char.islower():
+            has_lower = True
+        else:
+            continue
+        if has_digit and has_upper and has_lower:
+            break
+    return has_digit, has_upper, has_lower
+
+class LikeSchema(Schema):
+    # One like or unlike in a batch sent by the clients
+    user_id = fields.Integer(required=True, strict=True, validate=validate.Range(min=1))
+    app_id = fields.Integer(required=True, strict=True, validate=validate.Range(min=0))
+    op = fields.String(required=True, validate=validate.OneOf(['like', 'unlike']))
+
 class UserSchema(Schema):
     email = fields.String(required=True)
     password = fields.String(required=True)
@@ -8,12 +33,11 @@ class UserSchema(Schema):
 
     @validates('email')
     def validate_email(self, value):
-        # Validate email with a regex pattern
-        email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_regex, value):
-            raise ValidationError('Invalid email address format')
+        # Check the length first so the regex never runs on oversized input
         if len(value) > 254:
             raise ValidationError('Email address is too long')
+        if not EMAIL_REGEX.match(value):
+            raise ValidationError('Invalid email address format')
         
     def validate_id(self, value):
         # Validate the user ID
@@ -26,11 +50,23 @@ class UserSchema(Schema):
         # at least one uppercase letter, one lowercase letter, and one number
         if len(value) < 8:
             raise ValidationError('Password must be at least 8 characters long')
-        if not any(char.isdigit() for char in value):
+        if len(value) > 64:
+            raise ValidationError('Password must not exceed 64 characters')
+        has_digit, has_upper, has_lower = classify_password(value)
+        if not has_digit:
             raise ValidationError('Password must include at least one number')
-        if not any(char.isupper() for char in value):
+        if not has_upper:
             raise ValidationError('Password must include at least one uppercase letter')
-        if not any(char.islower() for char in value):
+        if not has_lower:
             raise ValidationError('Password must include at least one lowercase letter')
-        if len(value) > 64:
-            raise ValidationError('Password must not exceed 64 characters')
+
+    def validate_likes(self, items):
+        # Validate every item on its own, so one bad item doesn't reject the whole batch
+        like_schema = LikeSchema()
+        valid, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, like_schema.load(item)))
+            except ValidationError as e:
+                errors[index] = e.messages
+        return valid, errors
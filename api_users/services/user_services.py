@@ -1,10 +1,99 @@
+import hmac
+from collections import namedtuple
+from enum import Enum
 from flask import jsonify
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from logger.logger_users import Logger
+from common.id_allocator import IdAllocator
+
+DEFAULT_BATCH_SIZE = 1000  # Documents fetched per round trip when streaming
+MAX_LIKE_BATCH = 1000  # Likes and unlikes accepted in one batch
+DEFAULT_LIKED_PAGE_SIZE = 50  # Liked apps returned per page when expanded
+MAX_LIKED_PAGE_SIZE = 200  # Upper bound for the liked apps page size
+
+class LoginStatus(Enum):
+    OK = 'ok'
+    USER_NOT_FOUND = 'user_not_found'
+    WRONG_PASSWORD = 'wrong_password'
+
+# Outcome of a login, user is the user without its password when status is OK
+LoginResult = namedtuple('LoginResult', ['status', 'user'])
+
+class LikeStatus(Enum):
+    DONE = 'done'
+    UNCHANGED = 'unchanged'  # Already liked, or not liked when unliking
+    USER_NOT_FOUND = 'user_not_found'
+
+def plan_likes(likes):
+    # likes is a list of (index, {'user_id', 'app_id', 'op'}) in the order the client sent them
+    results = {}
+    # Only the last operation on a user/app pair matters, the unordered bulk write may run them in any order
+    last_ops = {}
+    for index, like in likes:
+        key = (like['user_id'], like['app_id'])
+        if key in last_ops:
+            results[last_ops[key][0]] = {'status': 'superseded'}
+        last_ops[key] = (index, like)
+
+    requests, indexes, planned = [], [], []
+    for index, like in last_ops.values():
+        operator = '$addToSet' if like['op'] == 'like' else '$pull'
+        requests.append(UpdateOne({'_id': like['user_id']}, {operator: {'likedApps': like['app_id']}}))
+        indexes.append(index)
+        planned.append(like)
+    return results, requests, indexes, planned
+
+def liked_pipeline(planned):
+    # For every user of the batch, which of the batch's apps they like right now, in one round trip
+    user_ids = list({like['user_id'] for like in planned})
+    app_ids = list({like['app_id'] for like in planned})
+    return [
+        {'$match': {'_id': {'$in': user_ids}}},
+        {'$project': {'liked': {'$filter': {
+            'input': {'$ifNull': ['$likedApps', []]}, 'as': 'app', 'cond': {'$in': ['$$app', app_ids]}
+        }}}}
+    ]
+
+def like_count_deltas(planned, liked):
+    # liked maps each existing user to the apps of the batch they like, returns the like_count change
+    # of every app, how many user documents the batch should modify and the status of every planned like
+    deltas, changes, statuses = {}, 0, []
+    for like in planned:
+        if like['user_id'] not in liked:
+            statuses.append(LikeStatus.USER_NOT_FOUND)
+            continue
+        already = like['app_id'] in liked[like['user_id']]
+        if like['op'] == 'like' and not already:
+            delta = 1
+        elif like['op'] == 'unlike' and already:
+            delta = -1
+        else:
+            statuses.append(LikeStatus.UNCHANGED)
+            continue
+        deltas[like['app_id']] = deltas.get(like['app_id'], 0) + delta
+        changes += 1
+        statuses.append(LikeStatus.DONE)
+    return deltas, changes, statuses
+
+def like_count_update(app_id, delta):
+    # Filter and update of an app's like_count, which lives on the app document and never goes below zero.
+    # likes_updated_at tells the similar apps job which apps to recompute
+    update = {'$inc': {'like_count': delta}, '$currentDate': {'likes_updated_at': True}}
+    if delta < 0:
+        return {'_id': app_id, 'like_count': {'$gt': 0}}, update
+    return {'_id': app_id}, update
+
+def check_password(user, password):
+    # Compare and drop the stored password, so it never leaves the service
+    stored_password = user.pop('password', None) or ''
+    return hmac.compare_digest(stored_password.encode(), password.encode())
 
 class UserService:
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, id_block_size=1):
         self.logger = Logger()
         self.db_conn = db_conn
+        self.id_allocator = IdAllocator(db_conn, 'users', id_block_size)
 
     def get_all_users(self):
         try:
@@ -14,6 +103,10 @@ class UserService:
             self.logger.error(f'Error fetching all users from the database: {e}')
             return jsonify({'error': f'Error fetching all users from the database: {e}'}), 500
 
+    def stream_all_users(self, batch_size=DEFAULT_BATCH_SIZE):
+        # Lazy cursor, users are fetched in batches while the response is written
+        return self.db_conn.db.users.find({}, {'password': 0}).sort('_id', 1).batch_size(batch_size)
+
     def get_user_by_email(self, email, password):
         try:
             user = list(self.db_conn.db.users.find({'email': email, 'password': password}))
@@ -27,6 +120,16 @@ class UserService:
             self.logger.error(f'Error fetching the user email from the database: {e}')
             return jsonify({'error': f'Error fetching the user email from the database, {e}'}), 505
 
+    def login(self, email, password):
+        # One query by email tells a missing user from a wrong password
+        user = self.db_conn.db.users.find_one({'email': email}, {'email': 1, 'password': 1, 'likedApps': 1})
+        if user is None:
+            return LoginResult(LoginStatus.USER_NOT_FOUND, None)
+
+        if not check_password(user, password):
+            return LoginResult(LoginStatus.WRONG_PASSWORD, None)
+        return LoginResult(LoginStatus.OK, user)
+
     def check_user_exists(self, email):
         try:
             # Search for a user with the provided email
@@ -38,10 +141,10 @@ class UserService:
 
     def get_liked_apps(self, user_id):
         try:
-            # Check if the user exists
-            user = self.get_user_by_id(user_id)
+            # Only read the liked apps of the user, None means the user does not exist
+            user = self.db_conn.db.users.find_one({'_id': user_id}, {'likedApps': 1})
             if not user:
-                return jsonify({'error': 'User not found'}), 404
+                return None
 
             # Get the liked apps
             liked_apps = user.get('likedApps', [])
@@ -50,44 +153,137 @@ class UserService:
             self.logger.error(f'Error fetching the liked apps: {e}')
             return jsonify({'error': f'Error fetching the liked apps: {e}'}), 500
 
-    def like_app(self, user_id, app_id):
+    def get_liked_apps_expanded(self, user_id, offset=0, limit=DEFAULT_LIKED_PAGE_SIZE):
         try:
-            # Check if the user exists
-            user = self.get_user_by_id(user_id)
+            # Read one extra ID with $slice to know if there is a next page
+            user = self.db_conn.db.users.find_one({'_id': user_id}, {'likedApps': {'$slice': [offset, limit + 1]}})
             if not user:
-                return jsonify({'error': 'User not found'}), 404
-
-            # Check if the app is already liked
-            user['likedApps'] = user.get('likedApps', [])
-            if app_id in user['likedApps']:
-                return jsonify({"warning": "User already saved that app"}), 505
-
-            # Add the app to the likedApps list
-            user['likedApps'].append(app_id)
-            result = self.db_conn.db.users.update_one({'_id': user_id}, {'$set': user})
-            if result.modified_count > 0:
-                return user
-            else:
-                return jsonify({"warning": "User already saved that app"}), 501
+                return None
+
+            app_ids = user.get('likedApps', [])
+            next_offset = offset + limit if len(app_ids) > limit else None
+            app_ids = app_ids[:limit]
+
+            # Both services share the microservices database, fetch every liked app with one $in query
+            apps = {app['_id']: app for app in self.db_conn.db.apps.find({'_id': {'$in': app_ids}})}
+
+            # Keep the order in which the apps were liked
+            return {
+                'apps': [apps[app_id] for app_id in app_ids if app_id in apps],
+                'missing': [app_id for app_id in app_ids if app_id not in apps],
+                'next_offset': next_offset
+            }
+        except Exception as e:
+            self.logger.error(f'Error fetching the liked apps: {e}')
+            return jsonify({'error': f'Error fetching the liked apps: {e}'}), 500
+
+    def like_app(self, user_id, app_id):
+        try:
+            # $addToSet only adds the app if it is not liked yet, in a single atomic write
+            result = self.db_conn.db.users.update_one({'_id': user_id}, {'$addToSet': {'likedApps': app_id}})
+            if result.matched_count == 0:
+                return LikeStatus.USER_NOT_FOUND
+            if result.modified_count == 0:
+                return LikeStatus.UNCHANGED
+            # Only a like that really changed the user moves the app's counter
+            self.update_like_count(app_id, 1)
+            return LikeStatus.DONE
         except Exception as e:
             self.logger.error(f'Error liking the app: {e}')
             return jsonify({'error': f'Error liking the app: {e}'}), 502
 
+    def unlike_app(self, user_id, app_id):
+        try:
+            # $pull removes the app from the liked apps in a single atomic write
+            result = self.db_conn.db.users.update_one({'_id': user_id}, {'$pull': {'likedApps': app_id}})
+            if result.matched_count == 0:
+                return LikeStatus.USER_NOT_FOUND
+            if result.modified_count == 0:
+                return LikeStatus.UNCHANGED
+            self.update_like_count(app_id, -1)
+            return LikeStatus.DONE
+        except Exception as e:
+            self.logger.error(f'Error unliking the app: {e}')
+            return jsonify({'error': f'Error unliking the app: {e}'}), 502
+
+    def update_like_count(self, app_id, delta):
+        # Both services share the microservices database, the counter is kept on the app document
+        try:
+            self.db_conn.db.apps.update_one(*like_count_update(app_id, delta))
+        except Exception as e:
+            # The like is saved, the counter is fixed by the next rebuild
+            self.logger.error(f'Error updating the like count of app {app_id}: {e}')
+
+    def remove_likes_of(self, user):
+        # A deleted user no longer likes anything
+        try:
+            updates = [UpdateOne(*like_count_update(app_id, -1)) for app_id in set(user.get('likedApps', []))]
+            if updates:
+                self.db_conn.db.apps.bulk_write(updates, ordered=False)
+        except Exception as e:
+            self.logger.error(f'Error removing the likes of user {user["_id"]}: {e}')
+
+    def recount_likes(self, app_ids):
+        # Exact counts for a few apps, through the likedApps index
+        for app_id in app_ids:
+            count = self.db_conn.db.users.count_documents({'likedApps': app_id})
+            self.db_conn.db.apps.update_one({'_id': app_id}, {'$set': {'like_count': count}, '$currentDate': {'likes_updated_at': True}})
+
+    def apply_likes(self, likes):
+        results, requests, indexes, planned = plan_likes(likes)
+        if not requests:
+            return {'results': results, 'matched': 0, 'modified': 0}
+
+        try:
+            # Read what the users like now, to know which apps gain or lose a like
+            liked = {user['_id']: set(user['liked']) for user in self.db_conn.db.users.aggregate(liked_pipeline(planned))}
+            deltas, changes, statuses = like_count_deltas(planned, liked)
+
+            # A single round trip for the whole batch
+            result = self.db_conn.db.users.bulk_write(requests, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get('writeErrors', []):
+                results[indexes[error['index']]] = {'status': 'failed', 'error': error.get('errmsg')}
+        except Exception as e:
+            self.logger.error(f'Error applying the likes batch: {e}')
+            return jsonify({'error': f'Error applying the likes batch: {e}'}), 502
+
+        try:
+            if details.get('nModified', 0) == changes and not details.get('writeErrors'):
+                # The batch did exactly what was read before it, apply the counter changes in one round trip
+                updates = [UpdateOne(*like_count_update(app_id, delta)) for app_id, delta in deltas.items() if delta]
+                if updates:
+                    self.db_conn.db.apps.bulk_write(updates, ordered=False)
+            else:
+                # A concurrent write or a failed item, count the touched apps again
+                self.recount_likes({like['app_id'] for like in planned})
+        except Exception as e:
+            # The likes are saved, the counters are fixed by the next rebuild
+            self.logger.error(f'Error updating the like counts of the batch: {e}')
+
+        # Failed items keep their error, the others get the outcome read before the write
+        for index, status in zip(indexes, statuses):
+            results.setdefault(index, {'status': status.value})
+        return {'results': results, 'matched': details.get('nMatched', 0), 'modified': details.get('nModified', 0)}
+
     def add_user(self, new_user):
         try:
             # Check if the user already exists
             if self.check_user_exists(new_user['email']):
                 return jsonify({'error': 'User already exists'}), 400
 
-            # Find the last _id and increment
-            last_user = self.db_conn.db.users.find_one(sort=[('_id', -1)])
-            next_id = (last_user['_id'] + 1) if last_user else 1
-            new_user['_id'] = next_id
+            # Take the next _id from the shared counter
+            new_user['_id'] = self.id_allocator.next()
             new_user['likedApps'] = [0]
 
             # Insert the new user
             self.db_conn.db.users.insert_one(new_user)
             return new_user
+        except DuplicateKeyError:
+            # Another signup with the same email won the race, answer like the route's own check
+            return jsonify({'error': 'User already exists'}), 403
         except Exception as e:
             self.logger.error(f'Error creating the new user: {e}')
             return jsonify({'error': f'Error creating the new user: {e}'}), 500
@@ -118,10 +314,11 @@ class UserService:
 
     def delete_user(self, user_id):
         try:
-            existing_user = self.get_user_by_id(user_id)  # Check if user exists
+            # Delete and get the user back in one step, so its likes are only taken off the counters once
+            existing_user = self.db_conn.db.users.find_one_and_delete({'_id': user_id})
 
             if existing_user:
-                self.db_conn.db.users.delete_one({'_id': user_id})
+                self.remove_likes_of(existing_user)
                 return existing_user
             else:
                 return None
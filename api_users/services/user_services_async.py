@@ -0,0 +1,204 @@
+from quart import jsonify
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from logger.logger_users import Logger
+from common.id_allocator import AsyncIdAllocator
+from services.user_services import (
+    DEFAULT_BATCH_SIZE, DEFAULT_LIKED_PAGE_SIZE, LikeStatus, LoginResult, LoginStatus, check_password, plan_likes,
+    liked_pipeline, like_count_deltas, like_count_update
+)
+
+class AsyncUserService:
+    # Same surface as UserService, every database call is awaited on the motor driver
+    def __init__(self, db_conn, id_block_size=1):
+        self.logger = Logger()
+        self.db_conn = db_conn
+        self.id_allocator = AsyncIdAllocator(db_conn, 'users', id_block_size)
+
+    async def get_all_users(self):
+        try:
+            users = await self.db_conn.db.users.find({}, {'password': 0}).to_list(length=None)  # Exclude passwords
+            return users
+        except Exception as e:
+            self.logger.error(f'Error fetching all users from the database: {e}')
+            return jsonify({'error': f'Error fetching all users from the database: {e}'}), 500
+
+    def stream_all_users(self, batch_size=DEFAULT_BATCH_SIZE):
+        # Async cursor, users are fetched in batches while the response is written
+        return self.db_conn.db.users.find({}, {'password': 0}).sort('_id', 1).batch_size(batch_size)
+
+    async def login(self, email, password):
+        user = await self.db_conn.db.users.find_one({'email': email}, {'email': 1, 'password': 1, 'likedApps': 1})
+        if user is None:
+            return LoginResult(LoginStatus.USER_NOT_FOUND, None)
+
+        if not check_password(user, password):
+            return LoginResult(LoginStatus.WRONG_PASSWORD, None)
+        return LoginResult(LoginStatus.OK, user)
+
+    async def check_user_exists(self, email):
+        try:
+            user = await self.db_conn.db.users.find_one({'email': email}, {'_id': 1})
+            return user is not None
+        except Exception as e:
+            self.logger.error(f'Error checking if user exists: {e}')
+            raise
+
+    async def get_liked_apps(self, user_id):
+        try:
+            user = await self.db_conn.db.users.find_one({'_id': user_id}, {'likedApps': 1})
+            if not user:
+                return None
+
+            return user.get('likedApps', [])
+        except Exception as e:
+            self.logger.error(f'Error fetching the liked apps: {e}')
+            return jsonify({'error': f'Error fetching the liked apps: {e}'}), 500
+
+    async def get_liked_apps_expanded(self, user_id, offset=0, limit=DEFAULT_LIKED_PAGE_SIZE):
+        try:
+            user = await self.db_conn.db.users.find_one({'_id': user_id}, {'likedApps': {'$slice': [offset, limit + 1]}})
+            if not user:
+                return None
+
+            app_ids = user.get('likedApps', [])
+            next_offset = offset + limit if len(app_ids) > limit else None
+            app_ids = app_ids[:limit]
+
+            cursor = self.db_conn.db.apps.find({'_id': {'$in': app_ids}})
+            apps = {app['_id']: app async for app in cursor}
+
+            return {
+                'apps': [apps[app_id] for app_id in app_ids if app_id in apps],
+                'missing': [app_id for app_id in app_ids if app_id not in apps],
+                'next_offset': next_offset
+            }
+        except Exception as e:
+            self.logger.error(f'Error fetching the liked apps: {e}')
+            return jsonify({'error': f'Error fetching the liked apps: {e}'}), 500
+
+    async def like_app(self, user_id, app_id):
+        try:
+            result = await self.db_conn.db.users.update_one({'_id': user_id}, {'$addToSet': {'likedApps': app_id}})
+            if result.matched_count == 0:
+                return LikeStatus.USER_NOT_FOUND
+            if result.modified_count == 0:
+                return LikeStatus.UNCHANGED
+            await self.update_like_count(app_id, 1)
+            return LikeStatus.DONE
+        except Exception as e:
+            self.logger.error(f'Error liking the app: {e}')
+            return jsonify({'error': f'Error liking the app: {e}'}), 502
+
+    async def unlike_app(self, user_id, app_id):
+        try:
+            result = await self.db_conn.db.users.update_one({'_id': user_id}, {'$pull': {'likedApps': app_id}})
+            if result.matched_count == 0:
+                return LikeStatus.USER_NOT_FOUND
+            if result.modified_count == 0:
+                return LikeStatus.UNCHANGED
+            await self.update_like_count(app_id, -1)
+            return LikeStatus.DONE
+        except Exception as e:
+            self.logger.error(f'Error unliking the app: {e}')
+            return jsonify({'error': f'Error unliking the app: {e}'}), 502
+
+    async def update_like_count(self, app_id, delta):
+        try:
+            await self.db_conn.db.apps.update_one(*like_count_update(app_id, delta))
+        except Exception as e:
+            self.logger.error(f'Error updating the like count of app {app_id}: {e}')
+
+    async def remove_likes_of(self, user):
+        try:
+            updates = [UpdateOne(*like_count_update(app_id, -1)) for app_id in set(user.get('likedApps', []))]
+            if updates:
+                await self.db_conn.db.apps.bulk_write(updates, ordered=False)
+        except Exception as e:
+            self.logger.error(f'Error removing the likes of user {user["_id"]}: {e}')
+
+    async def recount_likes(self, app_ids):
+        for app_id in app_ids:
+            count = await self.db_conn.db.users.count_documents({'likedApps': app_id})
+            await self.db_conn.db.apps.update_one({'_id': app_id}, {'$set': {'like_count': count}, '$currentDate': {'likes_updated_at': True}})
+
+    async def apply_likes(self, likes):
+        results, requests, indexes, planned = plan_likes(likes)
+        if not requests:
+            return {'results': results, 'matched': 0, 'modified': 0}
+
+        try:
+            cursor = self.db_conn.db.users.aggregate(liked_pipeline(planned))
+            liked = {user['_id']: set(user['liked']) async for user in cursor}
+            deltas, changes, statuses = like_count_deltas(planned, liked)
+
+            result = await self.db_conn.db.users.bulk_write(requests, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get('writeErrors', []):
+                results[indexes[error['index']]] = {'status': 'failed', 'error': error.get('errmsg')}
+        except Exception as e:
+            self.logger.error(f'Error applying the likes batch: {e}')
+            return jsonify({'error': f'Error applying the likes batch: {e}'}), 502
+
+        try:
+            if details.get('nModified', 0) == changes and not details.get('writeErrors'):
+                updates = [UpdateOne(*like_count_update(app_id, delta)) for app_id, delta in deltas.items() if delta]
+                if updates:
+                    await self.db_conn.db.apps.bulk_write(updates, ordered=False)
+            else:
+                await self.recount_likes({like['app_id'] for like in planned})
+        except Exception as e:
+            self.logger.error(f'Error updating the like counts of the batch: {e}')
+
+        for index, status in zip(indexes, statuses):
+            results.setdefault(index, {'status': status.value})
+        return {'results': results, 'matched': details.get('nMatched', 0), 'modified': details.get('nModified', 0)}
+
+    async def add_user(self, new_user):
+        try:
+            if await self.check_user_exists(new_user['email']):
+                return jsonify({'error': 'User already exists'}), 400
+
+            new_user['_id'] = await self.id_allocator.next()
+            new_user['likedApps'] = [0]
+
+            await self.db_conn.db.users.insert_one(new_user)
+            return new_user
+        except DuplicateKeyError:
+            # Another signup with the same email won the race, answer like the route's own check
+            return jsonify({'error': 'User already exists'}), 403
+        except Exception as e:
+            self.logger.error(f'Error creating the new user: {e}')
+            return jsonify({'error': f'Error creating the new user: {e}'}), 500
+
+    async def get_user_by_id(self, user_id):
+        try:
+            return await self.db_conn.db.users.find_one({'_id': user_id})
+        except Exception as e:
+            self.logger.error(f'Error fetching the user id from the database: {e}')
+            return jsonify({'error': f'Error fetching the user id from the database: {e}'}), 500
+
+    async def update_user(self, user_id, updated_user):
+        try:
+            result = await self.db_conn.db.users.update_one({'_id': user_id}, {'$set': updated_user})
+            if result.matched_count == 0:
+                return None
+            if result.modified_count > 0:
+                return updated_user
+            return 'The user is already up-to-date'
+        except Exception as e:
+            self.logger.error(f'Error updating the user: {e}')
+            return jsonify({'error': f'Error updating the user: {e}'}), 500
+
+    async def delete_user(self, user_id):
+        try:
+            # Returns the deleted user, or None if it did not exist
+            user = await self.db_conn.db.users.find_one_and_delete({'_id': user_id})
+            if user:
+                await self.remove_likes_of(user)
+            return user
+        except Exception as e:
+            self.logger.error(f'Error deleting the user data: {e}')
+            return jsonify({'error': f'Error deleting the user data: {e}'}), 500
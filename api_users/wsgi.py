@@ -0,0 +1,4 @@
+from app import create_app
+
+# Imported by every gunicorn worker after the fork, so each worker has its own MongoClient pool
+app = create_app()
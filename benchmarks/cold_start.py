@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_healthy(url, timeout):
+    # Poll the healthcheck until it answers 200 or the timeout expires
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.01)
+    return False
+
+def measure(service, port, timeout):
+    # Seconds from spawning the service to its first healthy /healthcheck
+    env = {**os.environ, 'PYTHONPATH': ROOT}
+    command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port)]
+    started = time.monotonic()
+    process = subprocess.Popen(command, cwd=os.path.join(ROOT, service), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_healthy(f'http://127.0.0.1:{port}/healthcheck', timeout):
+            raise RuntimeError(f'{service} was not healthy after {timeout}s')
+        return time.monotonic() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the time to the first healthy /healthcheck')
+    parser.add_argument('service', choices=['api_users', 'api_apps'])
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    timings = sorted(measure(args.service, args.port, args.timeout) for _ in range(args.runs))
+    print(f'{args.service}: min {timings[0]:.3f}s  median {timings[len(timings) // 2]:.3f}s  max {timings[-1]:.3f}s')
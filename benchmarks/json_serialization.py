@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import json_provider  # noqa: E402
+
+def make_apps(count):
+    # App documents shaped like the apps collection, plus the BSON types Mongo can return
+    return [{
+        '_id': index,
+        'name': f'App {index}',
+        'info': 'Short information about the app',
+        'description': 'A longer description of the app ' * random.randint(1, 8),
+        'url': f'https://example.com/apps/{index}',
+        'logo_url': f'https://example.com/apps/{index}/logo.png',
+        'origin': random.choice(['web', 'android', 'ios']),
+        'author': str(random.randint(1, 1000)),
+        'ref': ObjectId(),
+        'created': datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=index)
+    } for index in range(count)]
+
+def stdlib_encode(obj):
+    # What Flask's default provider does: json.dumps with a default hook, then encode to bytes
+    return json.dumps(obj, default=json_provider.bson_default, sort_keys=True).encode()
+
+def bench(name, encode, apps, runs):
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = encode(apps)
+        best = min(best, time.perf_counter() - started)
+    print(f'{name:>10}: {best * 1000:8.2f} ms  {len(apps) / best:12,.0f} docs/s  {len(body) / 1e6:.1f} MB')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare JSON encoders on a list of app documents')
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    apps = make_apps(args.count)
+    bench('stdlib', stdlib_encode, apps, args.runs)
+    bench('provider', json_provider.encode, apps, args.runs)
@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+import subprocess
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+PASSWORD = 'Benchmark1'
+
+# Every endpoint of both services: (name, method, path, body), path and body are built from a request counter
+def user_scenarios(args):
+    users, apps = args.users, args.apps
+    user = lambda n: n % users + 1
+    app = lambda n: n % apps + 1
+    return [
+        ('users.get_users', 'GET', lambda n: '/api/v1/users', None),
+        ('users.get_users_stream', 'GET', lambda n: '/api/v1/users?stream=1', None),
+        ('users.add_user', 'POST', lambda n: '/api/v1/users', lambda n: {'email': f'new{n}@bench.io', 'password': PASSWORD}),
+        ('users.get_login_user', 'GET', lambda n: f'/api/v1/users/login?email=user{user(n)}@bench.io&password={PASSWORD}', None),
+        ('users.liked_apps', 'GET', lambda n: f'/api/v1/users/like?user_id={user(n)}', None),
+        ('users.liked_apps_expanded', 'GET', lambda n: f'/api/v1/users/like?user_id={user(n)}&expand=apps', None),
+        ('users.like_app', 'POST', lambda n: '/api/v1/users/like', lambda n: {'user_id': user(n), 'app_id': app(n * 7)}),
+        ('users.unlike_app', 'DELETE', lambda n: '/api/v1/users/like', lambda n: {'user_id': user(n), 'app_id': app(n * 7)}),
+        ('users.like_apps_batch', 'POST', lambda n: '/api/v1/users/like/batch',
+         lambda n: [{'user_id': user(n + i), 'app_id': app(n + i), 'op': 'like'} for i in range(50)]),
+        ('users.update_user', 'PUT', lambda n: f'/api/v1/users/{user(n)}', lambda n: {'email': f'user{user(n)}@bench.io'}),
+        ('users.get_user_by_id', 'GET', lambda n: f'/api/v1/users/{user(n)}', None),
+        ('users.delete_user', 'DELETE', lambda n: f'/api/v1/users/{users - n % users}', None),  # From the last seeded user down
+        ('users.readyz', 'GET', lambda n: '/readyz', None),
+    ]
+
+def app_scenarios(args):
+    apps = args.apps
+    app = lambda n: n % apps + 1
+    new_app = lambda n: {
+        'name': f'New app {n}', 'info': 'Benchmark app', 'description': 'Created by the load test',
+        'url': 'https://bench.io', 'logo_url': 'https://bench.io/logo.png', 'origin': 'web', 'author': '1'
+    }
+    return [
+        ('apps.get_apps', 'GET', lambda n: '/api/v1/apps', None),
+        ('apps.get_apps_page', 'GET', lambda n: f'/api/v1/apps?after={app(n * 13)}&limit=50', None),
+        ('apps.get_apps_stream', 'GET', lambda n: '/api/v1/apps?stream=1', None),
+        ('apps.get_apps_by_ids', 'GET', lambda n: '/api/v1/apps?ids=' + ','.join(str(app(n + i * 17)) for i in range(20)), None),
+        ('apps.search_apps', 'GET', lambda n: f'/api/v1/apps/search?prefix=App{n % 10}&origin=web&limit=20', None),
+        ('apps.search_apps_text', 'GET', lambda n: f'/api/v1/apps/search?q=App{app(n)}&limit=20', None),
+        ('apps.get_apps_by_author', 'GET', lambda n: f'/api/v1/apps/by-author/{n % 1000 + 1}?limit=20', None),
+        ('apps.get_top_apps', 'GET', lambda n: f'/api/v1/apps/top?limit={n % 50 + 1}', None),
+        ('apps.get_similar_apps', 'GET', lambda n: f'/api/v1/apps/{app(n)}/similar', None),
+        ('apps.add_app', 'POST', lambda n: '/api/v1/apps', new_app),
+        ('apps.get_app_by_id', 'GET', lambda n: f'/api/v1/apps/{app(n)}', None),
+        ('apps.get_app_by_name', 'GET', lambda n: f'/api/v1/apps/App{app(n)}', None),
+        ('apps.update_app', 'PUT', lambda n: f'/api/v1/apps/{app(n)}', lambda n: {'info': f'Updated info {n}'}),
+        ('apps.delete_app', 'DELETE', lambda n: f'/api/v1/apps/{apps - n % apps}', None),
+        ('apps.readyz', 'GET', lambda n: '/readyz', None),
+    ]
+
+TEXT_FIELDS = ('name', 'info', 'description')  # Fields of the apps text index
+
+def mock_bulk_write(self, requests, ordered=True, **options):
+    # mongomock's bulk_write breaks on the current pymongo operations, apply them one by one instead
+    from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+    from pymongo.errors import BulkWriteError, WriteError
+    from pymongo.results import BulkWriteResult
+
+    details = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [], 'writeErrors': []}
+    for index, op in enumerate(requests):
+        try:
+            if isinstance(op, InsertOne):
+                self.insert_one(op._doc)
+                details['nInserted'] += 1
+                continue
+            if isinstance(op, (DeleteOne, DeleteMany)):
+                delete = self.delete_one if isinstance(op, DeleteOne) else self.delete_many
+                details['nRemoved'] += delete(op._filter).deleted_count
+                continue
+            if isinstance(op, ReplaceOne):
+                result = self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, UpdateOne):
+                result = self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, UpdateMany):
+                result = self.update_many(op._filter, op._doc, upsert=op._upsert)
+            else:
+                raise TypeError(f'{type(op).__name__} is not supported by the mongomock backend')
+            details['nMatched'] += result.matched_count
+            details['nModified'] += result.modified_count
+            if result.upserted_id is not None:
+                details['nUpserted'] += 1
+                details['upserted'].append({'index': index, '_id': result.upserted_id})
+        except WriteError as e:
+            details['writeErrors'].append({'index': index, 'code': e.code, 'errmsg': str(e), 'op': op})
+            if ordered:
+                break
+
+    if details['writeErrors']:
+        raise BulkWriteError(details)
+    return BulkWriteResult(details, True)
+
+def mock_text_search(query):
+    # mongomock has no text index: $text becomes a case-insensitive regex on any search term over the indexed
+    # fields. Enough to time the route, use --backend mongod for the cost of the real text search
+    text = query.pop('$text')
+    terms = '|'.join(re.escape(term) for term in text['$search'].split())
+    match = {'$or': [{field: {'$regex': terms, '$options': 'i'}} for field in TEXT_FIELDS]}
+    return {'$and': [query, match]} if query else match
+
+def without_text_score(keys):
+    # Drop the textScore projections and sort keys, relevance then falls back to the _id tie-break
+    if isinstance(keys, dict):
+        return {key: value for key, value in keys.items() if not isinstance(value, dict)} or None
+    if isinstance(keys, list):
+        return [(key, value) for key, value in keys if not isinstance(value, dict)]
+    return keys
+
+def use_mongomock():
+    # Point every MongoModel at one shared in-memory store instead of a server
+    import mongomock
+    from mongomock.collection import Collection, Cursor
+    from mongomock.store import ServerStore
+    from common.models import MongoModel
+
+    store = ServerStore()
+
+    class MockClient(mongomock.MongoClient):
+        def __init__(self, host=None, port=None, **options):
+            super().__init__(host, port, _store=store)
+
+    # Fill in what the services use and mongomock lacks
+    find, sort = Collection.find, Cursor.sort
+
+    def mock_find(self, filter=None, projection=None, *args, **kwargs):
+        if filter and '$text' in filter:
+            filter, projection = mock_text_search(dict(filter)), without_text_score(projection)
+        return find(self, filter, projection, *args, **kwargs)
+
+    def mock_sort(self, key_or_list, direction=None):
+        return sort(self, without_text_score(key_or_list), direction)
+
+    Collection.bulk_write = mock_bulk_write
+    Collection.find = mock_find
+    Cursor.sort = mock_sort
+    MongoModel.client_class = MockClient
+
+def seed(db, args):
+    # Fill both collections in chunks, users like a few random apps
+    db.users.delete_many({})
+    db.apps.delete_many({})
+    db.counters.delete_many({})
+    chunk = 10000
+    for start in range(1, args.apps + 1, chunk):
+        db.apps.insert_many([{
+            '_id': i, 'name': f'App{i}', 'name_key': f'app{i}', 'info': 'Seeded app', 'description': 'Seeded by the load test',
+            'url': 'https://bench.io', 'logo_url': 'https://bench.io/logo.png', 'origin': 'web', 'author': str(i % 1000 + 1), 'like_count': 0
+        } for i in range(start, min(start + chunk, args.apps + 1))])
+    for start in range(1, args.users + 1, chunk):
+        db.users.insert_many([{
+            '_id': i, 'email': f'user{i}@bench.io', 'password': PASSWORD,
+            'likedApps': random.sample(range(1, args.apps + 1), min(args.likes, args.apps))
+        } for i in range(start, min(start + chunk, args.users + 1))])
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of sorted values
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run_scenario(send, scenario, args):
+    name, method, path, body = scenario
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, errors = [], 0
+
+    def one(_):
+        nonlocal errors
+        n = next(counter)
+        started = time.perf_counter()
+        status = send(method, path(n), body(n) if body else None)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'endpoint': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / total, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def in_process_sender(app):
+    # Calls the WSGI app directly, each thread gets its own test client
+    local = threading.local()
+
+    def send(method, path, body):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.open(path, method=method, json=body)
+        response.get_data()  # Consume streamed bodies
+        return response.status_code
+    return send
+
+def http_sender(base_url):
+    # Sends real HTTP requests to a running service
+    def send(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(base_url + path, data=data, method=method, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 599
+    return send
+
+def run_service(args):
+    # Build the service in this process, its modules (app, models, services...) clash with the other service
+    service_dir = os.path.join(ROOT, f'api_{args.service}')
+    sys.path[:0] = [ROOT, service_dir]
+    os.environ.setdefault('DB_WARM_UP', 'off')
+    os.environ.setdefault('SWAGGER_ENABLED', '0')
+    if args.backend == 'mongomock':
+        for name in ('MONGODB_USER', 'MONGODB_PASS', 'MONGODB_HOST'):
+            os.environ.setdefault(name, 'benchmark')
+        use_mongomock()
+
+    base_url = args.base_url
+    if base_url:
+        # The service owns its database, seed it through the same MONGODB_* settings
+        from common.models import mongo_client_options, MongoModel
+        db = MongoModel.client_class(**mongo_client_options(logging.getLogger(__name__)))['microservices']
+        send = http_sender(base_url.rstrip('/'))
+    else:
+        from app import create_app
+        app = create_app()
+        db = app.extensions['db_conn'].db
+        send = in_process_sender(app)
+
+    if not args.no_seed:
+        seed(db, args)
+
+    scenarios = user_scenarios(args) if args.service == 'users' else app_scenarios(args)
+    selected = [s for s in scenarios if not args.only or s[0] in args.only]
+    return [run_scenario(send, scenario, args) for scenario in selected]
+
+def check(results, thresholds_file):
+    # Compare against the thresholds, returns the list of regressions
+    with open(thresholds_file) as f:
+        thresholds = json.load(f)
+    failures = []
+    for result in results:
+        limits = thresholds.get(result['endpoint'], {})
+        if 'max_p95_ms' in limits and result['p95_ms'] > limits['max_p95_ms']:
+            failures.append(f"{result['endpoint']}: p95 {result['p95_ms']} ms > {limits['max_p95_ms']} ms")
+        if 'min_rps' in limits and result['rps'] < limits['min_rps']:
+            failures.append(f"{result['endpoint']}: {result['rps']} rps < {limits['min_rps']} rps")
+        if result['errors'] > limits.get('max_errors', 0):
+            failures.append(f"{result['endpoint']}: {result['errors']} errors")
+    return failures
+
+def print_table(results):
+    print(f"{'endpoint':<28}{'requests':>9}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['endpoint']:<28}{r['requests']:>9}{r['errors']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test every endpoint of the users and apps services')
+    parser.add_argument('--service', choices=['users', 'apps', 'all'], default='all')
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock',
+                        help='mongomock keeps the data in memory, mongod uses the MONGODB_* server')
+    parser.add_argument('--base-url', help='Send HTTP requests to a running service instead of calling it in process')
+    parser.add_argument('--users', type=int, default=1000, help='Users to seed, e.g. 1000, 100000 or 1000000')
+    parser.add_argument('--apps', type=int, default=1000, help='Apps to seed')
+    parser.add_argument('--likes', type=int, default=10, help='Liked apps per seeded user')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight')
+    parser.add_argument('--only', nargs='*', help='Endpoints to run, e.g. apps.get_app_by_id')
+    parser.add_argument('--no-seed', action='store_true', help='Keep the data already in the database')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--check', nargs='?', const=THRESHOLDS, help='Fail when a result breaks the thresholds file')
+    args = parser.parse_args()
+    if args.base_url and args.backend == 'mongomock':
+        parser.error('--base-url needs --backend mongod, the in-memory store is not shared with the running service')
+
+    if args.service == 'all':
+        # Each service runs in its own process, then the results are merged
+        results = []
+        for service in ('users', 'apps'):
+            command = [sys.executable, __file__, '--service', service, '--backend', args.backend, '--json', '-',
+                       '--users', str(args.users), '--apps', str(args.apps), '--likes', str(args.likes),
+                       '--requests', str(args.requests), '--concurrency', str(args.concurrency)]
+            if args.only:
+                command += ['--only', *args.only]
+            if args.no_seed:
+                command.append('--no-seed')
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results.extend(json.loads(output.strip().splitlines()[-1]))
+    else:
+        results = run_service(args)
+
+    if args.json == '-':
+        print(json.dumps(results))
+        sys.exit(0)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        failures = check(results, args.check)
+        for failure in failures:
+            print(f'REGRESSION {failure}')
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,67 @@
+import os
+import sys
+import argparse
+import itertools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'api_apps')]
+
+from common.models import MongoModel  # noqa: E402
+from logger.logger_apps import Logger  # noqa: E402
+from models.app_models import INDEXES  # noqa: E402
+from services.app_services import SEARCH_SORTS, search_query  # noqa: E402
+
+def stages(plan):
+    # Every stage name of an explain() plan, whatever the nesting of the server version
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from stages(value)
+
+def combinations():
+    # Every supported mix of search, filters and sort key
+    for text, prefix, origin, author in itertools.product(['app'], [None, 'App1'], [None, 'web'], [None, '7']):
+        for use_text in (False, True):
+            for sort in SEARCH_SORTS:
+                if sort == 'relevance' and not use_text:
+                    continue
+                yield dict(text=text if use_text else None, prefix=prefix, origin=origin, author=author, sort=sort)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fail if a supported app search turns into a collection scan')
+    parser.add_argument('--apps', type=int, default=5000, help='Apps to seed in the scratch database')
+    parser.add_argument('--db', default='search_plans', help='Scratch database, dropped at the end')
+    args = parser.parse_args()
+
+    db_conn = MongoModel(Logger(), INDEXES, db_name=args.db)
+    db_conn.connect_to_database()
+    collection = db_conn.db.apps
+    failures = 0
+
+    try:
+        # Enough apps for the planner to prefer the indexes the way it does in production
+        collection.delete_many({})
+        collection.insert_many([{
+            '_id': i, 'name': f'App{i}', 'name_key': f'app{i}', 'info': f'Info about app {i}', 'description': 'Seeded app for the plan checks',
+            'url': 'https://example.com', 'logo_url': 'https://example.com/logo.png',
+            'origin': ['web', 'android', 'ios'][i % 3], 'author': str(i % 100)
+        } for i in range(1, args.apps + 1)])
+
+        for params in combinations():
+            query, projection, sort_keys = search_query(**params)
+            plan = collection.find(query, projection).sort(sort_keys).limit(51).explain()
+            winning = list(stages(plan['queryPlanner']['winningPlan']))
+            scan = 'COLLSCAN' in winning
+            failures += scan
+            shown = {key: value for key, value in params.items() if value}
+            print(f'{"FAIL" if scan else "ok":>4}  {shown}  {" <- ".join(winning)}')
+    finally:
+        db_conn.client.drop_database(args.db)
+        db_conn.close_connection()
+
+    print(f'{failures} collection scans')
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'api_apps')]
+
+import numpy  # noqa: E402
+from services.similar_apps import like_matrix, top_similar  # noqa: E402
+
+def make_users(users, apps, likes, seed=7):
+    # Users liking a few apps each, popularity follows a Zipf law like a real catalog
+    rng = numpy.random.default_rng(seed)
+    sizes = rng.poisson(likes, users) + 1
+    liked = (rng.zipf(1.3, sizes.sum()) - 1) % apps + 1
+    bounds = numpy.concatenate(([0], numpy.cumsum(sizes)))
+    for user in range(users):
+        yield {'likedApps': liked[bounds[user]:bounds[user + 1]].tolist()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the similar apps build on a synthetic catalog')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--apps', type=int, default=100000)
+    parser.add_argument('--likes', type=float, default=10, help='Average likes per user')
+    args = parser.parse_args()
+
+    app_ids = list(range(1, args.apps + 1))
+    columns = {app_id: column for column, app_id in enumerate(app_ids)}
+
+    started = time.perf_counter()
+    matrix = like_matrix(make_users(args.users, args.apps, args.likes), columns)
+    loaded = time.perf_counter()
+    print(f'matrix: {matrix.shape[0]} users x {matrix.shape[1]} apps, {matrix.nnz} likes in {loaded - started:.1f} s')
+
+    counts = numpy.asarray(matrix.sum(axis=0)).ravel()
+    targets = [column for column in range(len(app_ids)) if counts[column] > 0]
+    lists = sum(1 for _ in top_similar(matrix, app_ids, counts, targets))
+    print(f'similar: {lists} lists in {time.perf_counter() - loaded:.1f} s')
@@ -0,0 +1,10 @@
+import os
+
+def default_config():
+    # Settings shared by both services, read from environment variables
+    return {
+        'SWAGGER_ENABLED': os.environ.get('SWAGGER_ENABLED', '1') == '1',  # Serve the API docs on /apidocs
+        'DB_WARM_UP': os.environ.get('DB_WARM_UP', 'background'),  # eager, background or off
+        'READY_PING_TIMEOUT_MS': int(os.environ.get('READY_PING_TIMEOUT_MS', 1000)),  # Max wait for the readiness ping
+        'READY_LATENCY_BUDGET_MS': int(os.environ.get('READY_LATENCY_BUDGET_MS', 250)),  # Slower pings report not ready
+    }
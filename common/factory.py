@@ -0,0 +1,71 @@
+import threading
+from flask import Flask, jsonify
+from flask_cors import CORS
+from common.config import default_config
+from common.json_provider import FastJSONProvider
+from common.metrics import init_metrics
+from common.tracing import init_tracing
+
+def create_app(config):
+    # Build a service from its config:
+    #   NAME        import name of the Flask application
+    #   MODEL       MongoModel subclass holding the database connection
+    #   BLUEPRINTS  callable receiving the connection and returning the blueprints to register,
+    #               wrap the services and schemas in Traced to time them per request
+    #   SERVICE     service name used to label the metrics
+    config = {**default_config(), **config}
+
+    app = Flask(config['NAME'])
+    app.config.update(config)
+    app.json = FastJSONProvider(app)  # jsonify through orjson, with BSON types support
+    CORS(app)  # Enable CORS for the application
+
+    if config['SWAGGER_ENABLED']:
+        # Only load flasgger's UI and spec views when the docs are enabled
+        from flasgger import Swagger
+        Swagger(app)
+
+    # The client is created on first use, so this does not touch the network
+    db_conn = config['MODEL']()
+    app.extensions['db_conn'] = db_conn  # Keep it around to close it on shutdown
+    init_metrics(app, config['SERVICE'], db_conn)
+    init_tracing(app, config['SERVICE'], db_conn)
+
+    for blueprint in config['BLUEPRINTS'](db_conn):
+        app.register_blueprint(blueprint)
+
+    @app.get('/healthcheck')
+    @app.get('/livez')
+    def livez():
+        # Liveness only says the process answers, it never checks the database
+        return jsonify({'status': 'up'}), 200
+
+    @app.get('/readyz')
+    def readyz():
+        # Readiness pings MongoDB and fails when it is unreachable or slower than the budget
+        budget = config['READY_LATENCY_BUDGET_MS']
+        report = {'pool': db_conn.pool_stats.snapshot(), 'latency_budget_ms': budget}
+        try:
+            latency_ms = db_conn.ping(config['READY_PING_TIMEOUT_MS'] / 1000) * 1000
+        except Exception as e:
+            return jsonify({**report, 'status': 'down', 'error': f'MongoDB ping failed: {e}'}), 503
+
+        report['ping_ms'] = round(latency_ms, 2)
+        if latency_ms > budget:
+            return jsonify({**report, 'status': 'degraded'}), 503
+        return jsonify({**report, 'status': 'ready'}), 200
+
+    warm_up(db_conn, config['DB_WARM_UP'])
+    return app
+
+def warm_up(db_conn, mode):
+    # Check the database and create the indexes now, in the background, or leave it to the first query
+    if mode == 'eager':
+        db_conn.connect_to_database()
+    elif mode == 'background':
+        def connect():
+            try:
+                db_conn.connect_to_database()
+            except Exception:
+                pass  # Already logged, the next query will retry the connection
+        threading.Thread(target=connect, name='db-warm-up', daemon=True).start()
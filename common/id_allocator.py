@@ -0,0 +1,101 @@
+import os
+import asyncio
+import threading
+from pymongo import ReturnDocument
+
+class IdAllocator:
+    # Hands out sequential integer _id values from a document in the "counters" collection.
+    # With block_size > 1 every worker leases a block of IDs with a single round trip
+    # and serves the following inserts from memory.
+    def __init__(self, db_conn, name, block_size=1):
+        self.db_conn = db_conn
+        self.name = name  # Name of the collection the IDs are for, also the counter _id
+        self.block_size = max(1, block_size)
+        self.seeded = False
+        self.reset()
+        # A forked worker must never reuse the block leased by its parent
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.lock = threading.Lock()  # Guards the leased block
+        self.seed_lock = threading.Lock()  # Only held until the counter is seeded
+        self.next_id = None  # Next ID to hand out from the leased block
+        self.last_id = None  # Last ID of the leased block
+
+    def seed(self):
+        # Start the counter after the highest _id already stored, $max keeps this safe to repeat
+        last_doc = self.db_conn.db[self.name].find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        last_id = last_doc['_id'] if last_doc else 0
+        self.db_conn.db.counters.update_one({'_id': self.name}, {'$max': {'seq': last_id}}, upsert=True)
+        self.seeded = True
+
+    def reserve(self, count):
+        # Atomically move the counter forward and return the last reserved ID
+        counter = self.db_conn.db.counters.find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'seq': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['seq']
+
+    def ensure_seeded(self):
+        # Seed once per process, once done the lock is never taken again
+        if not self.seeded:
+            with self.seed_lock:
+                if not self.seeded:
+                    self.seed()
+
+    def next(self):
+        self.ensure_seeded()
+        if self.block_size == 1:
+            # $inc is atomic, concurrent inserts don't need to queue behind each other's round trip
+            return self.reserve(1)
+        with self.lock:
+            if self.next_id is None or self.next_id > self.last_id:
+                self.last_id = self.reserve(self.block_size)
+                self.next_id = self.last_id - self.block_size + 1
+            value = self.next_id
+            self.next_id += 1
+            return value
+
+class AsyncIdAllocator(IdAllocator):
+    # Same allocator for the async users service, db_conn holds a motor database
+    def reset(self):
+        self.lock = asyncio.Lock()
+        self.seed_lock = asyncio.Lock()
+        self.next_id = None
+        self.last_id = None
+
+    async def seed(self):
+        last_doc = await self.db_conn.db[self.name].find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        last_id = last_doc['_id'] if last_doc else 0
+        await self.db_conn.db.counters.update_one({'_id': self.name}, {'$max': {'seq': last_id}}, upsert=True)
+        self.seeded = True
+
+    async def reserve(self, count):
+        counter = await self.db_conn.db.counters.find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'seq': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['seq']
+
+    async def ensure_seeded(self):
+        if not self.seeded:
+            async with self.seed_lock:
+                if not self.seeded:
+                    await self.seed()
+
+    async def next(self):
+        await self.ensure_seeded()
+        if self.block_size == 1:
+            return await self.reserve(1)
+        async with self.lock:
+            if self.next_id is None or self.next_id > self.last_id:
+                self.last_id = await self.reserve(self.block_size)
+                self.next_id = self.last_id - self.block_size + 1
+            value = self.next_id
+            self.next_id += 1
+            return value
@@ -0,0 +1,57 @@
+import json
+import base64
+import datetime
+from uuid import UUID
+from decimal import Decimal
+from bson import Binary, Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson  # Optional, several times faster than the standard library
+except ImportError:
+    orjson = None
+
+def bson_default(value):
+    # Turn the BSON and Python types json can't encode into JSON values
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, (Binary, bytes)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def encode(obj):
+        # orjson writes bytes straight from the documents, datetime and UUID are handled natively
+        return orjson.dumps(obj, default=bson_default, option=ORJSON_OPTIONS)
+
+    decode = orjson.loads
+else:
+    json_encoder = json.JSONEncoder(default=bson_default, ensure_ascii=False, separators=(',', ':'))
+
+    def encode(obj):
+        return json_encoder.encode(obj).encode()
+
+    decode = json.loads
+
+class FastJSONProvider(JSONProvider):
+    # Flask JSON provider on orjson, with the standard library as fallback. Keys are not sorted.
+    def dumps(self, obj, **kwargs):
+        return encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return decode(s)
+
+    def response(self, *args, **kwargs):
+        # Build the body from the encoded bytes, without going through a str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode(obj) + b'\n', mimetype='application/json')
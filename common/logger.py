@@ -0,0 +1,149 @@
+import os
+import json
+import queue
+import atexit
+import threading
+import contextvars
+import logging as log
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = '%(asctime)s:%(levelname)s [%(filename)s:%(lineno)s] [%(request_id)s] %(message)s'
+# Trace of the request being handled by this thread, set by common.tracing
+current_trace = contextvars.ContextVar('current_trace', default=None)
+setup_lock = threading.Lock()
+setup_done = False
+
+class JsonFormatter(log.Formatter):
+    # One JSON object per line, for log collectors
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'file': record.filename,
+            'line': record.lineno,
+            'request_id': record.request_id,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+class ModuleLevelFilter(log.Filter):
+    # Applies LOG_LEVELS per module (file name without .py), the other modules use the default level
+    def __init__(self, default_level, module_levels):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = module_levels
+
+    def filter(self, record):
+        return record.levelno >= self.module_levels.get(record.module, self.default_level)
+
+class RequestIdFilter(log.Filter):
+    # Adds the ID of the current request to every record, '-' outside of a request
+    def filter(self, record):
+        trace = current_trace.get()
+        record.request_id = trace.request_id if trace is not None else '-'
+        return True
+
+class BoundedQueueHandler(QueueHandler):
+    # Hands records to the listener thread, when the queue is full it blocks or drops the record
+    def __init__(self, records, block):
+        super().__init__(records)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_levels(value):
+    # "app_services=DEBUG,user_routes=WARNING" -> {'app_services': 10, 'user_routes': 30}
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        module, _, level = item.partition('=')
+        levels[module.strip()] = log.getLevelName(level.strip().upper())
+    return levels
+
+def setup_logging(log_file, level):
+    # Configure the root logger once per process from the LOG_* environment variables:
+    #   LOG_LEVEL         default level, LOG_LEVELS per module overrides
+    #   LOG_FORMAT        text or json
+    #   LOG_QUEUE_SIZE    records buffered for the writer thread, 0 writes on the calling thread
+    #   LOG_QUEUE_POLICY  block or drop when the buffer is full
+    global setup_done
+    with setup_lock:
+        if setup_done:
+            return
+        setup_done = True
+
+        default_level = log.getLevelName(os.environ.get('LOG_LEVEL', log.getLevelName(level)).upper())
+        module_levels = parse_levels(os.environ.get('LOG_LEVELS', ''))
+        formatter = JsonFormatter() if os.environ.get('LOG_FORMAT') == 'json' else log.Formatter(TEXT_FORMAT, datefmt='%I:%M:%S %p')
+
+        handlers = [log.FileHandler(log_file), log.StreamHandler()]  # Save logs to a file and print them
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        root = log.getLogger()
+        root.setLevel(min([default_level, *module_levels.values()]))
+        level_filter = ModuleLevelFilter(default_level, module_levels)
+        request_id_filter = RequestIdFilter()
+
+        queue_size = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+        if queue_size <= 0:
+            for handler in handlers:
+                handler.addFilter(level_filter)
+                handler.addFilter(request_id_filter)
+                root.addHandler(handler)
+            return
+
+        # The request threads only enqueue, a listener thread does the disk and console I/O
+        queue_handler = BoundedQueueHandler(queue.Queue(queue_size), os.environ.get('LOG_QUEUE_POLICY', 'block') != 'drop')
+        queue_handler.addFilter(level_filter)
+        queue_handler.addFilter(request_id_filter)  # Runs on the request thread, where the trace is known
+        root.addHandler(queue_handler)
+
+        def start_listener():
+            listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)  # Flush what is left in the queue on exit
+
+        def restart_listener():
+            # The listener thread does not survive a fork, the child needs its own queue and thread
+            queue_handler.queue = queue.Queue(queue_size)
+            start_listener()
+
+        start_listener()
+        os.register_at_fork(after_in_child=restart_listener)
+
+class Logger:
+    # Logger shared by both services, each service subclasses it with its own log file
+    def __init__(self, log_file='api.log', level=log.INFO):
+        # Set up the logging system the first time a Logger is created
+        setup_logging(log_file, level)
+        self.logger = log.getLogger()  # Create a logger object
+
+    # Log a debug message
+    def debug(self, message):
+        self.logger.debug(message, stacklevel=2)
+
+    # Log an info message
+    def info(self, message):
+        self.logger.info(message, stacklevel=2)
+
+    # Log a warning message
+    def warning(self, message):
+        self.logger.warning(message, stacklevel=2)
+
+    # Log an error message
+    def error(self, message):
+        self.logger.error(message, stacklevel=2)
+
+    # Log a critical message
+    def critical(self, message):
+        self.logger.critical(message, stacklevel=2)
@@ -0,0 +1,98 @@
+import os
+import time
+import threading
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo.monitoring import CommandListener
+
+# With PROMETHEUS_MULTIPROC_DIR set every gunicorn worker writes its samples there and /metrics merges them
+REQUESTS = Counter('http_requests_total', 'HTTP requests handled', ['service', 'endpoint', 'method', 'status'])
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['service', 'endpoint', 'method'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+MONGO_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency', ['service', 'command', 'collection', 'outcome'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+class CacheCollector:
+    # Reads hits, misses and evictions from the caches at scrape time, they keep their own counters
+    def __init__(self):
+        self.caches = {}  # (service, cache name) -> object with a stats() method
+
+    def collect(self):
+        hits = CounterMetricFamily('cache_hits', 'Cache lookups served from the cache', labels=['service', 'cache'])
+        misses = CounterMetricFamily('cache_misses', 'Cache lookups that went to the database', labels=['service', 'cache'])
+        evictions = CounterMetricFamily('cache_evictions', 'Entries evicted by the size bound', labels=['service', 'cache'])
+        entries = GaugeMetricFamily('cache_entries', 'Entries held by in-process caches', labels=['service', 'cache'])
+        for (service, name), cache in list(self.caches.items()):
+            stats = cache.stats()
+            hits.add_metric([service, name], stats['hits'])
+            misses.add_metric([service, name], stats['misses'])
+            evictions.add_metric([service, name], stats['evictions'])
+            if 'size' in stats:
+                entries.add_metric([service, name], stats['size'])
+        return [hits, misses, evictions, entries]
+
+CACHES = CacheCollector()
+REGISTRY.register(CACHES)
+
+def register_cache(service, name, cache):
+    # Export the stats of a cache on /metrics, a new cache under the same name replaces the old one
+    if cache is not None:
+        CACHES.caches[(service, name)] = cache
+
+class CommandTimer(CommandListener):
+    # Times every MongoDB command sent by the client
+    def __init__(self, service):
+        self.service = service
+        self.lock = threading.Lock()
+        self.collections = {}  # request_id -> collection, the finished events don't carry it
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self.lock:
+            self.collections[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def observe(self, event, outcome):
+        with self.lock:
+            collection = self.collections.pop(event.request_id, '')
+        MONGO_LATENCY.labels(self.service, event.command_name, collection, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self.observe(event, 'success')
+
+    def failed(self, event):
+        self.observe(event, 'failure')
+
+def init_metrics(app, service, db_conn):
+    # Record every request and expose everything on /metrics
+    db_conn.event_listeners.append(CommandTimer(service))
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        # Label by endpoint name, not by path, so IDs in URLs don't create new series
+        endpoint = request.endpoint or 'unmatched'
+        if started is not None and endpoint != 'metrics':
+            REQUEST_LATENCY.labels(service, endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(service, endpoint, request.method, response.status_code).inc()
+        return response
+
+    @app.get('/metrics')
+    def metrics():
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            # The caches live in each worker, these are the numbers of the worker answering the scrape
+            registry.register(CACHES)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+import pymongo
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+def mongo_client_options(logger):
+    # Connection settings shared by the sync and async clients, read from environment variables
+    mongodb_user = os.environ.get('MONGODB_USER')
+    mongodb_pass = os.environ.get('MONGODB_PASS')
+    mongodb_host = os.environ.get('MONGODB_HOST')
+
+    # Check if the required environment variables are set
+    if not mongodb_user or not mongodb_pass or not mongodb_host:
+        logger.critical('MongoDB environment variables are required but missing')
+        raise ValueError('Set environment variables: MONGODB_USER, MONGODB_PASS, MONGODB_HOST')
+
+    return {
+        'host': mongodb_host,  # Database host
+        'port': 27017,  # Default MongoDB port
+        'username': mongodb_user,  # Database username
+        'password': mongodb_pass,  # Database password
+        'authSource': 'admin',  # Authentication database
+        'authMechanism': 'SCRAM-SHA-256',  # Authentication method
+        'serverSelectionTimeoutMS': 5000,  # Timeout for server selection
+        'maxPoolSize': int(os.environ.get('MONGODB_MAX_POOL_SIZE', 100)),  # Connections per worker process
+        'minPoolSize': int(os.environ.get('MONGODB_MIN_POOL_SIZE', 0)),  # Connections kept open when idle
+        'waitQueueTimeoutMS': int(os.environ.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 0)) or None  # Max wait for a free connection, 0 waits forever
+    }
+
+class PoolStats(ConnectionPoolListener):
+    # Counts the connections of the client pool from the driver events, pymongo has no public API for it
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0  # Connections currently open
+        self.in_use = 0  # Connections checked out by a request
+        self.waiting = 0  # Requests waiting for a connection
+
+    def update(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self.lock:
+            return {'in_use': self.in_use, 'available': self.open - self.in_use, 'wait_queue': self.waiting}
+
+    def connection_created(self, event):
+        self.update(open=1)
+
+    def connection_closed(self, event):
+        self.update(open=-1)
+
+    def connection_check_out_started(self, event):
+        self.update(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self.update(waiting=-1)
+
+    def connection_checked_out(self, event):
+        self.update(waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self.update(in_use=-1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+class MongoModel:
+    # Database connection shared by both services. The client is created on first use of db,
+    # connect_to_database() is the explicit warm-up that also checks the server and creates the indexes.
+    client_class = MongoClient  # Replaced by the benchmarks with an in-memory stand-in
+
+    def __init__(self, logger, indexes=None, db_name='microservices'):
+        self.client = None  # MongoDB client will be stored here
+        self._db = None  # Database object will be stored here
+        self.logger = logger
+        self.indexes = indexes or {}  # Indexes to create, keyed by collection
+        self.db_name = db_name
+        self.lock = threading.Lock()
+        self.pool_stats = PoolStats()
+        self.event_listeners = [self.pool_stats]  # Driver listeners, add them before the first use of db
+
+    @property
+    def db(self):
+        # MongoClient does not talk to the server until the first command, so this stays cheap
+        if self._db is None:
+            with self.lock:
+                if self._db is None:
+                    self.client = self.client_class(**mongo_client_options(self.logger), event_listeners=self.event_listeners)
+                    self._db = self.client[self.db_name]
+        return self._db
+
+    def connect_to_database(self, create_indexes=True):
+        try:
+            # Log a message if the connection is successful
+            if self.db.list_collection_names():
+                self.logger.info('Connected to MongoDB database successfully')
+        except Exception as e:
+            # Log a critical error message if the connection fails
+            self.logger.critical(f'Failed to connect to the database: {e}')
+            raise
+
+        if create_indexes:
+            try:
+                # Make sure the indexes used by the queries exist
+                self.ensure_indexes()
+            except Exception as e:
+                # Keep serving without the indexes rather than refusing to start
+                self.logger.error(f'Failed to create the database indexes: {e}')
+
+    def ping(self, timeout):
+        # Round trip to the server bounded by timeout seconds, returns the latency in seconds
+        started = time.perf_counter()
+        with pymongo.timeout(timeout):
+            self.db.command('ping')
+        return time.perf_counter() - started
+
+    def ensure_indexes(self):
+        # create_indexes is a no-op for indexes that already exist with the same spec
+        for collection, indexes in self.indexes.items():
+            names = self.db[collection].create_indexes(indexes)
+            self.logger.info(f'Indexes ready on {collection}: {names}')
+
+    def close_connection(self):
+        # Close the connection to the database if it is open
+        with self.lock:
+            if self.client:
+                self.client.close()
+            self.client = None
+            self._db = None
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import queue
+import secrets
+import threading
+import urllib.request
+from functools import wraps
+from flask import g, request
+from pymongo.monitoring import CommandListener
+from common.logger import current_trace
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+REQUEST_ID = re.compile(r'^[\w\-.:]{1,128}$')
+
+class Trace:
+    # Timings of one request, split by phase
+    def __init__(self, trace_id, parent_id, request_id):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.request_id = request_id
+        self.started = time.time_ns()
+        self.phases = {}  # phase -> seconds
+        self.spans = []  # (phase, name, start_ns, end_ns) for the exporter
+
+    def record(self, phase, name, start_ns, end_ns):
+        self.phases[phase] = self.phases.get(phase, 0) + (end_ns - start_ns) / 1e9
+        self.spans.append((phase, name, start_ns, end_ns))
+
+def timed(function, phase, name):
+    # Add the time spent in function to the current request trace
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return function(*args, **kwargs)
+        start = time.time_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            trace.record(phase, name, start, time.time_ns())
+    return wrapper
+
+class Traced:
+    # Proxy timing every method call of the wrapped object as one phase, e.g. the service or the schema
+    def __init__(self, target, phase):
+        self._target = target
+        self._phase = phase
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if callable(attribute):
+            return timed(attribute, self._phase, name)
+        return attribute
+
+class MongoTimer(CommandListener):
+    # Adds every MongoDB command to the trace of the request that sent it, events fire on the calling thread
+    def __init__(self):
+        self.started_at = {}
+
+    def started(self, event):
+        if current_trace.get() is not None:
+            self.started_at[event.request_id] = time.time_ns()
+
+    def finished(self, event):
+        trace = current_trace.get()
+        start = self.started_at.pop(event.request_id, None)
+        if trace is not None and start is not None:
+            trace.record('mongo', event.command_name, start, start + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self.finished(event)
+
+    def failed(self, event):
+        self.finished(event)
+
+class OtlpExporter:
+    # Sends finished requests as OTLP/HTTP JSON spans to a local collector from a background thread
+    def __init__(self, endpoint, service, max_queue=10000, batch_size=512):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service = service
+        self.batch_size = batch_size
+        self.traces = queue.Queue(max_queue)
+        threading.Thread(target=self.run, name='otlp-exporter', daemon=True).start()
+        os.register_at_fork(after_in_child=self.restart)
+
+    def restart(self):
+        self.traces = queue.Queue(self.traces.maxsize)
+        threading.Thread(target=self.run, name='otlp-exporter', daemon=True).start()
+
+    def export(self, trace, name, status):
+        try:
+            self.traces.put_nowait((trace, name, status, time.time_ns()))
+        except queue.Full:
+            pass  # Never slow requests down for tracing
+
+    def run(self):
+        while True:
+            batch = [self.traces.get()]
+            while len(batch) < self.batch_size and not self.traces.empty():
+                batch.append(self.traces.get_nowait())
+            try:
+                self.send(batch)
+            except Exception:
+                pass  # The collector is optional, drop the batch
+
+    def send(self, batch):
+        spans = []
+        for trace, name, status, end in batch:
+            spans.append(self.span(trace, trace.span_id, trace.parent_id, name, trace.started, end, {'http.status_code': status}))
+            for phase, child, start, finish in trace.spans:
+                spans.append(self.span(trace, secrets.token_hex(8), trace.span_id, f'{phase} {child}', start, finish, {}))
+        body = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service}}]},
+            'scopeSpans': [{'scope': {'name': 'common.tracing'}, 'spans': spans}]
+        }]}
+        data = json.dumps(body).encode()
+        urllib.request.urlopen(urllib.request.Request(self.url, data, {'Content-Type': 'application/json'}), timeout=5).close()
+
+    def span(self, trace, span_id, parent_id, name, start, end, attributes):
+        return {
+            'traceId': trace.trace_id,
+            'spanId': span_id,
+            'parentSpanId': parent_id or '',
+            'name': name,
+            'kind': 2,  # SERVER
+            'startTimeUnixNano': str(start),
+            'endTimeUnixNano': str(end),
+            'attributes': [{'key': key, 'value': {'stringValue': str(value)}} for key, value in attributes.items()]
+        }
+
+def init_tracing(app, service, db_conn):
+    # Accept or create the request ID and trace context, time the phases and send them back in the response
+    db_conn.event_listeners.append(MongoTimer())
+    endpoint = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT')
+    exporter = OtlpExporter(endpoint, service) if endpoint else None
+
+    # Time the JSON encoding done by jsonify
+    app.json.response = timed(app.json.response, 'serialization', 'response')
+
+    @app.before_request
+    def start_trace():
+        match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+        trace_id, parent_id = (match.group(1), match.group(2)) if match else (secrets.token_hex(16), None)
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID.match(request_id):
+            request_id = trace_id
+        g.trace = Trace(trace_id, parent_id, request_id)
+        g.trace_token = current_trace.set(g.trace)
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.get('trace')
+        if trace is None:
+            return response
+        total = (time.time_ns() - trace.started) / 1e9
+        response.headers['X-Request-ID'] = trace.request_id
+        response.headers['traceparent'] = f'00-{trace.trace_id}-{trace.span_id}-01'
+        # Server-Timing shows the phases in the browser dev tools
+        timings = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in trace.phases.items()]
+        response.headers['Server-Timing'] = ', '.join([*timings, f'total;dur={total * 1000:.2f}'])
+        if exporter is not None:
+            exporter.export(trace, f'{request.method} {request.url_rule.rule if request.url_rule else request.path}', response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_trace(exception):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            current_trace.reset(token)